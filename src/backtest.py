@@ -1,37 +1,67 @@
+from typing import Optional
+import numpy as np
 import pandas as pd
 
-# Close-to-close backtest using shifted signals; returns df with strat_ret/equity
-def backtest_close(df: pd.DataFrame, fee_bps: float = 1.0, slippage_bps: float = 0.0) -> pd.DataFrame:
-    import pandas as pd
-
-
-    # Close-to-close backtest using shifted signals; returns df with strat_ret/equity
-    def backtest_close(df: pd.DataFrame, fee_bps: float = 1.0, slippage_bps: float = 0.0) -> pd.DataFrame:
-        out = df.copy()
-        out["ret"] = out["Close"].pct_change().fillna(0.0)
-        out["pos"] = out["signal"].shift(1).fillna(0).astype(int)
-        out["turnover"] = out["pos"].diff().abs().fillna(0)
-        fee = fee_bps / 10000.0
-        slippage = slippage_bps / 10000.0
-        out["cost"] = out["turnover"] * (fee + slippage)
-        out["strat_ret"] = out["pos"] * out["ret"] - out["cost"]
-        out["equity"] = (1.0 + out["strat_ret"]).cumprod()
-        out["buyhold"] = (1.0 + out["ret"]).cumprod()
-        return out
-
-
-    # Next-day open execution backtest; strat_ret uses open->close intraday returns
-    def backtest_open(df: pd.DataFrame, fee_bps: float = 1.0, slippage_bps: float = 0.0) -> pd.DataFrame:
-        out = df.copy()
-        out["oc_ret"] = (out["Close"] / out["Open"] - 1.0).fillna(0.0)
-        out["pos"] = out["signal"].shift(1).fillna(0).astype(int)
-        out["turnover"] = out["pos"].diff().abs().fillna(0)
-        fee = fee_bps / 10000.0
-        slippage = slippage_bps / 10000.0
-        out["cost"] = out["turnover"] * (fee + slippage)
-        out["strat_ret"] = out["pos"] * out["oc_ret"] - out["cost"]
-        out["equity"] = (1.0 + out["strat_ret"]).cumprod()
-        out["ret"] = out["Close"].pct_change().fillna(0.0)
-        out["buyhold"] = (1.0 + out["ret"]).cumprod()
-        return out
-        out["equity"] = (1.0 + out["strat_ret"]).cumprod()
+from regimes import realized_vol
+
+
+def vol_target_scale(df: pd.DataFrame, vol_target: float, vol_window: int = 21, max_leverage: float = 1.0, periods_per_year: int = 252) -> pd.Series:
+    """Exposure multiplier vol_target / realized vol (regimes.realized_vol), capped at max_leverage.
+
+    0 until the rolling vol is defined, so sized strategies stay flat during warm-up.
+    """
+    vol = realized_vol(df, window=vol_window, periods_per_year=periods_per_year)
+    return (vol_target / vol).clip(upper=max_leverage).fillna(0.0)
+
+
+def _positions(out: pd.DataFrame, vol_target: Optional[float], vol_window: int, max_leverage: float, periods_per_year: int) -> pd.Series:
+    # target exposure at each close (signal, optionally vol-scaled), held from the next bar
+    target = out["signal"]
+    if vol_target is not None:
+        target = target * vol_target_scale(out, vol_target, vol_window=vol_window, max_leverage=max_leverage, periods_per_year=periods_per_year)
+    pos = target.shift(1).fillna(0)
+    if pd.api.types.is_integer_dtype(target):
+        # binary/compact signals keep integer positions (int8 for make_signals(compact=True))
+        return pos.astype(np.int8 if target.dtype == np.int8 else int)
+    return pos
+
+
+def backtest_close(df: pd.DataFrame, fee_bps: float = 1.0, slippage_bps: float = 0.0, vol_target: Optional[float] = None, vol_window: int = 21, max_leverage: float = 1.0, periods_per_year: int = 252) -> pd.DataFrame:
+    """Close-to-close backtest using signals shifted by one bar (no lookahead).
+
+    Expects a 'signal' column (integer or fractional target weight). Adds ret, pos, turnover,
+    cost, strat_ret, equity and buyhold. With vol_target (annualized, e.g. 0.10) positions are
+    scaled by vol_target_scale, so pos and turnover become fractional and costs are charged
+    on fractional turnover.
+    """
+    out = df.copy()
+    out["ret"] = out["Close"].pct_change().fillna(0.0)
+    out["pos"] = _positions(out, vol_target, vol_window, max_leverage, periods_per_year)
+    out["turnover"] = out["pos"].diff().abs().fillna(0)
+    fee = fee_bps / 10000.0
+    slippage = slippage_bps / 10000.0
+    out["cost"] = out["turnover"] * (fee + slippage)
+    out["strat_ret"] = out["pos"] * out["ret"] - out["cost"]
+    out["equity"] = (1.0 + out["strat_ret"]).cumprod()
+    out["buyhold"] = (1.0 + out["ret"]).cumprod()
+    return out
+
+
+def backtest_open(df: pd.DataFrame, fee_bps: float = 1.0, slippage_bps: float = 0.0, vol_target: Optional[float] = None, vol_window: int = 21, max_leverage: float = 1.0, periods_per_year: int = 252) -> pd.DataFrame:
+    """Next-day open execution backtest; strat_ret uses open->close intraday returns.
+
+    buyhold stays close-to-close so both modes share the same benchmark. Position sizing
+    works as in backtest_close.
+    """
+    out = df.copy()
+    out["oc_ret"] = (out["Close"] / out["Open"] - 1.0).fillna(0.0)
+    out["pos"] = _positions(out, vol_target, vol_window, max_leverage, periods_per_year)
+    out["turnover"] = out["pos"].diff().abs().fillna(0)
+    fee = fee_bps / 10000.0
+    slippage = slippage_bps / 10000.0
+    out["cost"] = out["turnover"] * (fee + slippage)
+    out["strat_ret"] = out["pos"] * out["oc_ret"] - out["cost"]
+    out["equity"] = (1.0 + out["strat_ret"]).cumprod()
+    out["ret"] = out["Close"].pct_change().fillna(0.0)
+    out["buyhold"] = (1.0 + out["ret"]).cumprod()
+    return out
@@ -0,0 +1,197 @@
+from typing import Callable, Dict, Optional, Sequence, Tuple
+import numpy as np
+
+
+# precision modes: 'float64' is the reference; 'float32' stores returns in float32 and
+# positions/turnover in int8. Prices, moving averages and therefore signals are float64 in
+# both modes: the (..., S, T) averages are small next to the (..., P, T) blocks, and rounding
+# them to float32 turns near-ties on flat prices into signal flips.
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+
+
+def _dtype(precision: str):
+    try:
+        return PRECISIONS[precision]
+    except KeyError:
+        raise ValueError(f"Unknown precision: {precision}")
+
+
+def ema_matrix(close: np.ndarray, spans: Sequence[int]) -> np.ndarray:
+    """EMA of close for several spans at once, matching signals.ema (adjust=False).
+
+    close has shape (..., T) and must be NaN-free; returns float64 of shape
+    (..., len(spans), T). It follows pandas' ewm arithmetic step for step (alpha from com,
+    normalized update, no update when the price equals the EMA), so results are
+    bit-identical to signals.ema.
+    """
+    x = np.asarray(close, dtype=float)
+    alpha = 1.0 / (1.0 + (np.asarray(spans, dtype=float) - 1.0) / 2.0)
+    keep = 1.0 - alpha
+    n = x.shape[-1]
+    out = np.empty(x.shape[:-1] + (len(alpha), n))
+    if n == 0:
+        return out
+    prev = np.repeat(x[..., 0, None], len(alpha), axis=-1)
+    out[..., 0] = prev
+    for t in range(1, n):
+        cur = x[..., t, None]
+        # constant prices keep the EMA exactly constant, as in pandas
+        prev = np.where(prev != cur, (keep * prev + alpha * cur) / (keep + alpha), prev)
+        out[..., t] = prev
+    return out
+
+
+def ema_crossover_signals(close: np.ndarray, pairs: Sequence[Tuple[int, int]]) -> np.ndarray:
+    """Boolean long signal (ema_fast > ema_slow) for every pair; shape (..., P, T)."""
+    spans = sorted({s for pair in pairs for s in pair})
+    col = {s: i for i, s in enumerate(spans)}
+    e = ema_matrix(close, spans)
+    fast_idx = [col[f] for f, _ in pairs]
+    slow_idx = [col[s] for _, s in pairs]
+    return e[..., fast_idx, :] > e[..., slow_idx, :]
+
+
+def _same_run(x: np.ndarray) -> np.ndarray:
+    """Length of the run of equal non-NaN values ending at each bar (NaNs are skipped).
+
+    pandas' rolling mean/std return the value itself / 0 when this run covers the whole
+    window, so flat stretches tie exactly; the cumsum kernels below apply the same rule.
+    """
+    n = x.shape[-1]
+    t = np.arange(n)
+    valid = ~np.isnan(x)
+    last = np.maximum.accumulate(np.where(valid, t, -1), axis=-1)
+    prev_last = np.concatenate([np.full(x.shape[:-1] + (1,), -1), last[..., :-1]], axis=-1)
+    prev_val = np.take_along_axis(x, np.maximum(prev_last, 0), axis=-1)
+    run_start = np.maximum.accumulate(np.where(valid & ((prev_last < 0) | (x != prev_val)), t, -1), axis=-1)
+    cnt = np.cumsum(valid, axis=-1)
+    before = np.take_along_axis(cnt, np.maximum(run_start, 0), axis=-1) - 1
+    return np.where(run_start >= 0, cnt - before, 0)
+
+
+def sma_matrix(close: np.ndarray, windows: Sequence[int]) -> np.ndarray:
+    """Simple moving averages (min_periods=1) for several windows; shape (..., len(windows), T)."""
+    x = np.asarray(close, dtype=float)
+    n = x.shape[-1]
+    cs = np.zeros(x.shape[:-1] + (n + 1,))
+    np.cumsum(x, axis=-1, out=cs[..., 1:])
+    t = np.arange(1, n + 1)
+    run = _same_run(x)
+    out = np.empty(x.shape[:-1] + (len(windows), n))
+    for i, w in enumerate(windows):
+        lo = np.maximum(t - w, 0)
+        k = np.minimum(t, w)
+        out[..., i, :] = np.where(run >= k, x, (cs[..., t] - cs[..., lo]) / k)
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int, min_periods: int = 2) -> np.ndarray:
+    """Rolling sample std over the last axis, skipping NaNs like pandas rolling().std()."""
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    v = np.where(valid, x, 0.0)
+    n = x.shape[-1]
+    pad = x.shape[:-1] + (n + 1,)
+    s1, s2, cnt = np.zeros(pad), np.zeros(pad), np.zeros(pad)
+    np.cumsum(v, axis=-1, out=s1[..., 1:])
+    np.cumsum(v * v, axis=-1, out=s2[..., 1:])
+    np.cumsum(valid, axis=-1, out=cnt[..., 1:])
+    t = np.arange(1, n + 1)
+    lo = np.maximum(t - window, 0)
+    k = cnt[..., t] - cnt[..., lo]
+    total = s1[..., t] - s1[..., lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (s2[..., t] - s2[..., lo] - total * total / k) / (k - 1)
+        var = np.where(_same_run(x) >= k, 0.0, var)
+        return np.where(k >= max(min_periods, 2), np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def bar_returns(close: np.ndarray, open_: Optional[np.ndarray] = None, execution: str = "close", precision: str = "float64") -> np.ndarray:
+    """Per-bar returns earned while holding a position, shape (..., T).
+
+    'close' uses close-to-close returns (first bar 0), 'open' uses open->close returns.
+    """
+    close = np.asarray(close, dtype=float)
+    if execution == "close":
+        ret = np.zeros_like(close)
+        ret[..., 1:] = close[..., 1:] / close[..., :-1] - 1.0
+    elif execution == "open":
+        if open_ is None:
+            raise ValueError("open execution requires open prices")
+        ret = np.nan_to_num(close / np.asarray(open_, dtype=float) - 1.0)
+    else:
+        raise ValueError(f"Unknown execution mode: {execution}")
+    return ret.astype(_dtype(precision), copy=False)
+
+
+def vol_target_scale(close: np.ndarray, vol_target: float, vol_window: int = 21, max_leverage: float = 1.0, periods_per_year: int = 252) -> np.ndarray:
+    """Batched backtest.vol_target_scale: vol_target / rolling realized vol, capped; shape (..., T)."""
+    close = np.asarray(close, dtype=float)
+    ret = np.full(close.shape, np.nan)
+    ret[..., 1:] = close[..., 1:] / close[..., :-1] - 1.0
+    vol = rolling_std(ret, vol_window, min_periods=vol_window) * np.sqrt(periods_per_year)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.minimum(vol_target / vol, max_leverage)
+    return np.nan_to_num(scale, nan=0.0)
+
+
+def strategy_returns(signal: np.ndarray, ret: np.ndarray, fee_bps: float = 1.0, slippage_bps: float = 0.0, scale: Optional[np.ndarray] = None) -> np.ndarray:
+    """Batched equivalent of backtest_close/backtest_open strat_ret.
+
+    signal has shape (..., P, T) and ret shape (..., T); positions are the signal
+    (times scale, shape (..., T), when given) shifted by one bar and costs are charged on
+    the possibly fractional turnover. The result has ret's dtype, so float32 returns keep
+    the whole (..., P, T) block in float32.
+    """
+    compact = ret.dtype == np.float32
+    if scale is None:
+        pos = np.zeros(signal.shape, dtype=np.int8 if compact else float)
+        pos[..., 1:] = signal[..., :-1]
+    else:
+        pos = np.zeros(signal.shape, dtype=ret.dtype)
+        pos[..., 1:] = signal[..., :-1] * np.asarray(scale)[..., None, :-1]
+    turnover = np.zeros_like(pos)
+    turnover[..., 1:] = np.abs(np.diff(pos, axis=-1))
+    cost = ret.dtype.type((fee_bps + slippage_bps) / 10000.0)
+    return pos * ret[..., None, :] - turnover * cost
+
+
+def stats_matrix(strat_ret: np.ndarray, periods_per_year: int = 252) -> Dict[str, np.ndarray]:
+    """Vectorized perf_stats over the last axis; each value has shape strat_ret.shape[:-1].
+
+    Reductions (total growth, std) accumulate in float64 whatever the input dtype.
+    """
+    r = np.nan_to_num(np.asarray(strat_ret))
+    if not np.issubdtype(r.dtype, np.floating):
+        r = r.astype(float)
+    shape = r.shape[:-1]
+    n = r.shape[-1]
+    if n <= 1:
+        nan = np.full(shape, np.nan)
+        return {"ann_return": nan, "ann_vol": nan.copy(), "sharpe": nan.copy(), "max_drawdown": nan.copy()}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cumulative = np.cumprod(1 + r, axis=-1)
+        total = np.prod(1 + r, axis=-1, dtype=np.float64)
+        ann_ret = total ** (periods_per_year / n) - 1
+        ann_vol = r.std(axis=-1, ddof=1, dtype=np.float64) * np.sqrt(periods_per_year)
+        sharpe = np.where(ann_vol > 0, ann_ret / ann_vol, np.nan)
+        peak = np.maximum.accumulate(cumulative, axis=-1)
+        max_dd = (cumulative / peak - 1).min(axis=-1).astype(np.float64)
+    return {"ann_return": ann_ret, "ann_vol": ann_vol, "sharpe": sharpe, "max_drawdown": max_dd}
+
+
+def evaluate_grid(close: np.ndarray, pairs: Sequence[tuple], open_: Optional[np.ndarray] = None, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0, periods_per_year: int = 252, precision: str = "float64", signal_fn: Optional[Callable[..., np.ndarray]] = None, vol_target: Optional[float] = None, max_leverage: float = 1.0, vol_window: int = 21) -> Dict[str, np.ndarray]:
+    """Backtest every parameter tuple on close (shape (..., T)) in one pass.
+
+    signal_fn(close, pairs) builds the (..., P, T) signal block; it defaults to the EMA
+    crossover (see strategies.py for the other families). Signals do not depend on precision.
+    vol_target sizes positions by vol_target_scale, as in backtest_close(vol_target=...).
+    Returns perf_stats-style arrays of shape (..., P), in the order of pairs.
+    precision='float32' roughly halves the memory of the (..., P, T) intermediates;
+    see precision.compare_precision for the resulting deviation in stats.
+    """
+    signal = (signal_fn or ema_crossover_signals)(close, pairs)
+    ret = bar_returns(close, open_, execution=execution, precision=precision)
+    scale = None if vol_target is None else vol_target_scale(close, vol_target, vol_window=vol_window, max_leverage=max_leverage, periods_per_year=periods_per_year)
+    strat = strategy_returns(signal, ret, fee_bps=fee_bps, slippage_bps=slippage_bps, scale=scale)
+    return stats_matrix(strat, periods_per_year=periods_per_year)
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 # Small CLI wrapper to run the results runner
 import argparse
+import json
 import sys
 import os
+import urllib.error
+import urllib.request
+import pandas as pd
 
 # when running `python src/cli.py` the script's directory is `src/`, so importing `results` will import `src/results.py`.
 import results
+from executor import FileQueueExecutor, LocalExecutor
+from memory import parse_size
+from strategies import STRATEGIES
 
 
 def parse_args():
@@ -17,13 +24,119 @@ def parse_args():
     p.add_argument("--slippage-bps", type=float, default=0.0, help="Slippage in basis points")
     p.add_argument("--no-regimes", dest="compute_regimes", action="store_false", help="Do not compute regimes (faster)")
     p.add_argument("--outdir", default=None, help="Optional output directory for results (overrides default 'results')")
-    return p.parse_args()
+    p.add_argument("--bootstrap", type=int, default=0, help="Bootstrap resamples per fold for robustness output (0 disables)")
+    p.add_argument("--seed", type=int, default=None, help="Bootstrap seed for reproducible robustness CIs (default: random)")
+    p.add_argument("--jobs", type=int, default=1, help="Worker processes for bootstrap resampling (0 = all CPUs)")
+    p.add_argument("--engine", choices=["pandas", "batched"], default="pandas", help="Grid-search engine")
+    p.add_argument("--surface", dest="keep_surface", action="store_true", help="Save the full parameter surface per fold and heatmaps")
+    p.add_argument("--precision", choices=["float64", "float32"], default="float64", help="Numeric precision for batched grids (float32 halves memory)")
+    p.add_argument("--data-dir", default=None, help="Load <TICKER>.csv/.parquet bars (daily or intraday) from this folder instead of downloading")
+    p.add_argument("--bar", default=None, help="Resample local bars to this frequency, e.g. 5min, 1h, 1D")
+    p.add_argument("--chunksize", type=int, default=None, help="With --bar, stream local CSVs in chunks of this many rows and resample each chunk (bounds load memory)")
+    p.add_argument("--periods-per-year", type=int, default=None, help="Annualization factor (default: inferred from bar spacing)")
+    p.add_argument("--strategy", default="ema_cross", help=f"Comma-separated strategies to compare ({', '.join(sorted(STRATEGIES))})")
+    p.add_argument("--vol-target", type=float, default=None, help="Annualized volatility target for position sizing, e.g. 0.10 (default: unscaled positions)")
+    p.add_argument("--max-leverage", type=float, default=1.0, help="Cap on vol-targeted exposure")
+    p.add_argument("--workers", type=int, default=1, help="Worker processes running (ticker, strategy) units on this machine (0 = all CPUs)")
+    p.add_argument("--queue-dir", default=None, help="Distribute units through this shared-filesystem queue (run `python src/executor.py worker DIR` on each node)")
+    p.add_argument("--queue-workers", type=int, default=0, help="With --queue-dir, also start this many local worker processes")
+    p.add_argument("--max-memory", default=None, help="Run memory budget, e.g. 2G or 512M; sizes workers and batches to fit and reports peak RSS per stage")
+    p.add_argument("--server", default=None, help="URL of a running src/server.py (e.g. http://127.0.0.1:8765); runs walk-forward jobs there instead of locally")
+    args = p.parse_args()
+    unknown = [s.strip() for s in args.strategy.split(",") if s.strip() and s.strip() not in STRATEGIES]
+    if unknown:
+        p.error(f"unknown strategy: {', '.join(unknown)} (available: {', '.join(sorted(STRATEGIES))})")
+    if args.server:
+        # the server loads prices with its own --data-dir/--bar/--chunksize/--start and runs no bootstrap or memory budget
+        unsupported = [
+            flag for flag, given in (
+                ("--bootstrap", args.bootstrap), ("--max-memory", args.max_memory), ("--data-dir", args.data_dir),
+                ("--bar", args.bar), ("--chunksize", args.chunksize), ("--start", args.start != p.get_default("start")),
+            ) if given
+        ]
+        if unsupported:
+            p.error(f"{', '.join(unsupported)} cannot be used with --server (data options are set when starting src/server.py)")
+    return args
+
+
+def post_job(server: str, kind: str, payload: dict) -> dict:
+    """POST a job to the backtest service and return its result (raises on job errors)."""
+    req = urllib.request.Request(
+        f"{server.rstrip('/')}/{kind}", data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(req) as resp:
+            out = json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        out = json.loads(e.read() or b"{}")
+    if out.get("status") != "done":
+        raise RuntimeError(out.get("error", f"job failed: {out}"))
+    return out["result"]
+
+
+# fold date columns of the walk-forward frames, sent as ISO strings by the server
+FOLD_DATES = ["train_start", "train_end", "test_start", "test_end"]
+
+
+def _frame(records: list) -> pd.DataFrame:
+    df = pd.DataFrame(records)
+    for col in FOLD_DATES:
+        if col in df:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def run_remote(args, universe) -> str:
+    # walk-forward per ticker/strategy on the warm server; writes the same summary/regimes/surface CSVs as run_aggregate
+    outdir = args.outdir or "results"
+    os.makedirs(outdir, exist_ok=True)
+    strategies = [s.strip() for s in args.strategy.split(",") if s.strip()]
+    collected = {"summary": [], "regimes": [], "surface": []}
+    for ticker in universe:
+        for strategy in strategies:
+            label = ticker if len(strategies) == 1 else f"{ticker}_{strategy}"
+            payload = {
+                "ticker": ticker, "strategy": strategy, "execution": args.execution, "fee_bps": args.fee_bps,
+                "slippage_bps": args.slippage_bps, "engine": args.engine, "precision": args.precision,
+                "vol_target": args.vol_target, "max_leverage": args.max_leverage,
+                "compute_regimes": args.compute_regimes, "keep_surface": args.keep_surface,
+            }
+            if args.periods_per_year:
+                payload["periods_per_year"] = args.periods_per_year
+            try:
+                result = post_job(args.server, "walkforward", payload)
+            except Exception as e:
+                print(f"{label} failed: {e}")
+                continue
+            for kind, records in result.items():
+                frame = _frame(records)
+                frame["ticker"] = ticker
+                if kind == "surface":
+                    frame["strategy"] = strategy
+                frame.to_csv(os.path.join(outdir, f"{kind}_{label}_{args.execution}.csv"), index=False)
+                collected[kind].append(frame)
+    if not collected["summary"]:
+        raise RuntimeError("No summaries produced")
+    for kind, frames in collected.items():
+        if frames:
+            pd.concat(frames, ignore_index=True).to_csv(os.path.join(outdir, f"{kind}_all_{args.execution}.csv"), index=False)
+    return outdir
 
 
 def main():
     args = parse_args()
     universe = [s.strip().upper() for s in args.tickers.split(",") if s.strip()]
 
+    if args.server:
+        outdir = run_remote(args, universe)
+        print(f"Done. results folder: {outdir}")
+        return
+
+    if args.queue_dir:
+        executor = FileQueueExecutor(args.queue_dir, local_workers=args.queue_workers)
+    else:
+        executor = LocalExecutor(max_workers=args.workers or None)
+
     # call run_aggregate in results.py and pass outdir explicitly
     outdir = results.run_aggregate(
         universe,
@@ -33,6 +146,21 @@ def main():
         slippage_bps=args.slippage_bps,
         compute_regimes=args.compute_regimes,
         outdir=args.outdir,
+        n_bootstrap=args.bootstrap,
+        n_jobs=args.jobs or None,
+        engine=args.engine,
+        keep_surface=args.keep_surface,
+        precision=args.precision,
+        data_dir=args.data_dir,
+        bar=args.bar,
+        periods_per_year=args.periods_per_year,
+        vol_target=args.vol_target,
+        max_leverage=args.max_leverage,
+        strategies=[s.strip() for s in args.strategy.split(",") if s.strip()],
+        executor=executor,
+        max_memory=parse_size(args.max_memory) if args.max_memory else None,
+        chunksize=args.chunksize,
+        seed=args.seed,
     )
     print(f"Done. results folder: {outdir}")
 
@@ -1,24 +1,10 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import pandas as pd
 import yfinance as yf
 
-# Download OHLCV prices for a single ticker
-def download_prices(ticker: str, start: str = "2012-01-01") -> pd.DataFrame:
-    df = yf.download(ticker, start=start, auto_adjust=True, progress=False)
-    if df.empty:
-        raise ValueError(f"No data for {ticker}")
-    df = df.rename(columns=str.title)
-    return df[["Open", "High", "Low", "Close", "Volume"]].dropna()
 
-# Download prices for multiple tickers and return a dict
-def download_universe(tickers: List[str], start: str = "2012-01-01") -> Dict[str, pd.DataFrame]:
-    out: Dict[str, pd.DataFrame] = {}
-    for t in tickers:
-        out[t] = download_prices(t, start=start)
-    return out
-from typing import List, Dict
-import pandas as pd
-import yfinance as yf
+# OHLCV aggregation used when resampling to coarser bars
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
 
 
 def download_prices(ticker: str, start: str = "2012-01-01") -> pd.DataFrame:
@@ -39,3 +25,81 @@ def download_universe(tickers: List[str], start: str = "2012-01-01") -> Dict[str
     for t in tickers:
         out[t] = download_prices(t, start=start)
     return out
+
+
+def _normalize_bars(df: pd.DataFrame) -> pd.DataFrame:
+    # Title-case OHLCV columns on a sorted DatetimeIndex; Volume is optional in local files
+    df = df.rename(columns=lambda c: str(c).strip().title())
+    if "Volume" not in df.columns:
+        df["Volume"] = 0.0
+    missing = [c for c in OHLCV_AGG if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing price columns: {missing}")
+    df.index = pd.to_datetime(df.index)
+    return df[list(OHLCV_AGG)].sort_index()
+
+
+def resample_bars(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """Aggregate OHLCV bars to a coarser frequency (e.g. '5min', '1h', '1D').
+
+    Bars are left-labelled; empty buckets (nights, weekends) are dropped.
+    """
+    out = df.resample(rule, label="left", closed="left").agg(OHLCV_AGG)
+    return out.dropna(subset=["Close"])
+
+
+def _resample_chunk(chunk: pd.DataFrame, rule: str) -> pd.DataFrame:
+    # resampled bars of one CSV chunk plus the first/last raw timestamp behind each bar
+    df = _normalize_bars(chunk)
+    out = resample_bars(df, rule)
+    span = df.index.to_series().resample(rule, label="left", closed="left").agg(["min", "max"])
+    return out.assign(first_ts=span["min"].reindex(out.index), last_ts=span["max"].reindex(out.index))
+
+
+def load_prices(path: str, resample: Optional[str] = None, chunksize: Optional[int] = None) -> pd.DataFrame:
+    """Load OHLCV bars (daily or intraday) from a local CSV or parquet file.
+
+    The first CSV column is the timestamp. With resample, bars are aggregated on the fly;
+    with chunksize (CSV only) the file is streamed and resampled chunk by chunk, so only the
+    coarser bars are held in memory.
+    """
+    if path.endswith(".parquet"):
+        df = _normalize_bars(pd.read_parquet(path))
+        df = resample_bars(df, resample) if resample else df
+    elif chunksize and resample:
+        parts = [_resample_chunk(chunk, resample) for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize)]
+        if not parts:
+            raise ValueError(f"No data in {path}")
+        # a bar split across chunks shows up once per chunk; max/min/sum re-aggregate exactly and
+        # first/last follow the raw timestamps, so unsorted files match the unchunked path
+        parts = pd.concat(parts)
+        df = parts.groupby(level=0).agg({"High": "max", "Low": "min", "Volume": "sum"})
+        df["Open"] = parts.sort_values("first_ts", kind="stable").groupby(level=0)["Open"].first()
+        df["Close"] = parts.sort_values("last_ts", kind="stable").groupby(level=0)["Close"].last()
+        df = df[list(OHLCV_AGG)]
+    else:
+        df = _normalize_bars(pd.read_csv(path, index_col=0))
+        df = resample_bars(df, resample) if resample else df
+    if df.empty:
+        raise ValueError(f"No data in {path}")
+    return df.dropna(subset=["Open", "High", "Low", "Close"])
+
+
+def infer_periods_per_year(index: pd.DatetimeIndex, trading_days: int = 252) -> int:
+    """Infer the annualization factor from bar timestamps.
+
+    Intraday bars use (median bars per trading day) * trading_days; daily, weekly and
+    monthly bars map to 252, 52 and 12.
+    """
+    index = pd.DatetimeIndex(index)
+    if len(index) < 2:
+        return trading_days
+    bars_per_day = pd.Series(index.normalize()).value_counts().median()
+    if bars_per_day > 1:
+        return int(round(bars_per_day * trading_days))
+    spacing = pd.Series(index).diff().median() / pd.Timedelta(days=1)
+    if spacing >= 20:
+        return 12
+    if spacing >= 4:
+        return 52
+    return trading_days
@@ -0,0 +1,255 @@
+"""Differential equivalence harness: optimized engines vs the pandas reference.
+
+Generates random synthetic price histories (plain random walks, calendar gaps and price
+jumps, flat stretches, NaN prices, very short histories, Feb-29 starts that exercise
+walkforward._year_offset) and checks, per case:
+
+- signals:      strat.make_signals vs strat.batch_signals and
+                make_signals(compact=True), for every registered strategy
+- backtest:     backtest_close/open strat_ret vs batched.strategy_returns, with and
+                without vol targeting
+- perf_stats:   metrics.perf_stats vs batched.stats_matrix
+- walkforward:  run_walkforward_for_ticker engine='batched' (float64/float32) vs 'pandas'
+
+Signal flips are only tolerated at ties, where the reference moving averages agree to
+within TIE_TOL. Tolerated flips are not failures but are still counted (tied_flips). A different
+walk-forward selection is only tolerated where both picks have the same train return
+(a tie), in which case that fold's test stats are not compared.
+Every comparison is recorded; the report lists failures and the worst cases by
+error / tolerance, each reproducible from its (kind, seed).
+
+Usage: python src/equivalence.py --cases 10 --seed 0   (exit status 1 on any failure)
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+
+import batched
+from backtest import backtest_close, backtest_open
+from metrics import perf_stats
+from strategies import STRATEGIES
+from walkforward import run_walkforward_for_ticker
+
+
+KINDS = ["random_walk", "gaps", "flat", "nans", "short", "feb29"]
+STAT_KEYS = ["ann_return", "ann_vol", "sharpe", "max_drawdown"]
+WALKFORWARD_STATS = ["train_ann_return", "test_ann_return", "test_sharpe", "test_max_dd"]
+# leap years whose Feb 29 is a business day, so bdate_range starts the history on it
+FEB29_YEARS = [2000, 2008, 2012, 2016]
+
+# absolute tolerance on returns/stats by precision, and the relative gap between moving
+# averages treated as a tie (every engine compares its averages in float64)
+TOL = {"float64": 1e-9, "float32": 1e-4}
+TIE_TOL = 1e-9
+
+
+# --- synthetic prices ---------------------------------------------------------------
+
+def _ohlc(close: np.ndarray, rng: np.random.Generator, index: pd.DatetimeIndex) -> pd.DataFrame:
+    open_ = close * np.exp(rng.normal(0.0, 0.004, len(close)))
+    spread = np.abs(rng.normal(0.0, 0.006, len(close)))
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) * (1 + spread),
+        "Low": np.minimum(open_, close) * (1 - spread),
+        "Close": close,
+        "Volume": rng.integers(1_000, 100_000, len(close)).astype(float),
+    }, index=index)
+
+
+def make_prices(kind: str, seed: int) -> pd.DataFrame:
+    """Synthetic daily OHLCV history of the given kind; the same (kind, seed) gives the same frame."""
+    rng = np.random.default_rng([KINDS.index(kind), seed])
+    if kind == "short":
+        n = int(rng.choice([0, 1, 2, 3, 5, 10, 30, 120]))
+    else:
+        n = int(rng.integers(800, 1600))
+    start = pd.Timestamp(int(rng.choice(FEB29_YEARS)), 2, 29) if kind == "feb29" else pd.Timestamp("2010-01-04")
+    index = pd.bdate_range(start, periods=n)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0003, rng.uniform(0.005, 0.03), n)))
+    df = _ohlc(close, rng, index)
+    if kind == "gaps" and n:
+        # drop random blocks of bars (holidays, suspensions) and add overnight price jumps
+        keep = np.ones(n, dtype=bool)
+        for s in rng.integers(0, n, 6):
+            keep[s:s + int(rng.integers(1, 30))] = False
+        jumps = rng.random(n) < 0.01
+        scale = np.cumprod(np.where(jumps, np.exp(rng.normal(0.0, 0.15, n)), 1.0))
+        df[["Open", "High", "Low", "Close"]] = df[["Open", "High", "Low", "Close"]].mul(scale, axis=0)
+        df = df[keep]
+    elif kind == "flat" and n:
+        # constant-price stretches, including whole-history flat series
+        if rng.random() < 0.2:
+            df[["Open", "High", "Low", "Close"]] = 100.0
+        for s in rng.integers(0, n, 4):
+            seg = slice(s, s + int(rng.integers(5, 200)))
+            df.iloc[seg, :4] = float(df["Close"].iloc[s])
+    elif kind == "nans" and n:
+        for col in ("Close", "Open"):
+            df.loc[rng.random(n) < 0.01, col] = np.nan
+    return df
+
+
+# --- checks -------------------------------------------------------------------------
+
+def _record(records: List[dict], case: dict, check: str, error: float, tol: float, **detail):
+    records.append({**case, "check": check, "error": float(error), "tol": tol, "passed": bool(error <= tol), **detail})
+
+
+def _max_abs(a, b) -> float:
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    if a.shape != b.shape:
+        return np.inf
+    both_nan = np.isnan(a) & np.isnan(b)
+    diff = np.abs(np.where(both_nan, 0.0, a - b))
+    return float(np.nan_to_num(diff, nan=np.inf).max()) if diff.size else 0.0
+
+
+def _call(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        return e
+
+
+def _sample_params(strat, rng: np.random.Generator, n: int) -> List[tuple]:
+    valid = [tuple(p) for p in strat.default_grid if strat.valid(tuple(p))]
+    return [valid[i] for i in rng.choice(len(valid), size=min(n, len(valid)), replace=False)]
+
+
+def _signal_flips(ref: pd.DataFrame, signal: np.ndarray) -> Tuple[int, int]:
+    # (unexplained, tied) flips; a flip is tied where two of the reference moving averages
+    # are within TIE_TOL of price
+    flips = ref["signal"].to_numpy() != signal
+    tie = np.zeros_like(flips)
+    ma = ref.drop(columns=["Open", "High", "Low", "Close", "Volume", "signal"]).to_numpy(dtype=float)
+    if ma.shape[1] >= 2:
+        gaps = np.abs(ma[:, :, None] - ma[:, None, :])
+        gaps[:, np.arange(ma.shape[1]), np.arange(ma.shape[1])] = np.inf
+        tie |= gaps.min(axis=(1, 2)) <= TIE_TOL * np.abs(ref["Close"].to_numpy())
+    return int((flips & ~tie).sum()), int((flips & tie).sum())
+
+
+def check_components(df: pd.DataFrame, case: dict, rng: np.random.Generator, records: List[dict], params_per_strategy: int = 3):
+    """Signal, backtest and perf_stats checks for every strategy on one NaN-free history."""
+    close = df["Close"].to_numpy(dtype=float)
+    open_ = df["Open"].to_numpy(dtype=float)
+    for name, strat in STRATEGIES.items():
+        for params in _sample_params(strat, rng, params_per_strategy):
+            ctx = dict(strategy=name, params=str(params))
+            ref = strat.make_signals(df, params)
+            unexplained, tied = _signal_flips(ref, strat.batch_signals(close, [params])[0])
+            _record(records, case, "signals/batched", unexplained, 0, tied_flips=tied, **ctx)
+            unexplained, tied = _signal_flips(ref, strat.make_signals(df, params, compact=True)["signal"].to_numpy())
+            _record(records, case, "signals/compact", unexplained, 0, tied_flips=tied, **ctx)
+
+            signal = ref["signal"].to_numpy()[None, :]
+            for execution in ("close", "open"):
+                for vol_target in (None, 0.1):
+                    sizing = dict(vol_target=vol_target, max_leverage=1.5)
+                    run = backtest_close if execution == "close" else backtest_open
+                    bt = run(ref, fee_bps=1.0, slippage_bps=0.5, **sizing)
+                    scale = None if vol_target is None else batched.vol_target_scale(close, vol_target, max_leverage=1.5)
+                    ret = batched.bar_returns(close, open_, execution=execution)
+                    strat_ret = batched.strategy_returns(signal, ret, fee_bps=1.0, slippage_bps=0.5, scale=scale)[0]
+                    bctx = dict(ctx, execution=execution, vol_target=vol_target)
+                    _record(records, case, "backtest/strat_ret", _max_abs(bt["strat_ret"], strat_ret), TOL["float64"], **bctx)
+                    ref_stats = perf_stats(bt["strat_ret"])
+                    stats = batched.stats_matrix(bt["strat_ret"].to_numpy()[None, :])
+                    for k in STAT_KEYS:
+                        _record(records, case, f"perf_stats/{k}", _max_abs(ref_stats[k], stats[k][0]), TOL["float64"], **bctx)
+
+
+def check_walkforward(df: pd.DataFrame, case: dict, rng: np.random.Generator, records: List[dict], grid_size: int = 12):
+    """run_walkforward_for_ticker: batched float64/float32 vs the pandas engine, per fold."""
+    train_years, test_years = int(rng.integers(1, 3)), 1
+    for name, strat in STRATEGIES.items():
+        grid = _sample_params(strat, rng, grid_size)
+        execution = str(rng.choice(["close", "open"]))
+        vol_target = None if rng.random() < 0.5 else 0.1
+        kwargs = dict(grid=grid, train_years=train_years, test_years=test_years, execution=execution, fee_bps=1.0, slippage_bps=0.5, strategy=name, vol_target=vol_target, max_leverage=1.5)
+        ref = _call(run_walkforward_for_ticker, df, engine="pandas", **kwargs)
+        for precision in ("float64", "float32"):
+            ctx = dict(strategy=name, execution=execution, vol_target=vol_target)
+            out = _call(run_walkforward_for_ticker, df, engine="batched", precision=precision, **kwargs)
+            check = f"walkforward/batched_{precision}"
+            if isinstance(ref, Exception) or isinstance(out, Exception):
+                # both engines must fail the same way (e.g. an empty history)
+                same = repr(ref) == repr(out)
+                _record(records, case, f"{check}/error", 0 if same else np.inf, 0, **ctx)
+                continue
+            if len(out) != len(ref):
+                _record(records, case, f"{check}/folds", np.inf, 0, **ctx)
+                continue
+            best_cols = [f"best_{p}" for p in strat.param_names]
+            for i in range(len(ref)):
+                a, b = ref.iloc[i], out.iloc[i]
+                fctx = dict(ctx, fold=str(a["train_start"].date()))
+                if "error" in ref and pd.notna(a.get("error")) or "error" in out and pd.notna(b.get("error")):
+                    same = str(a.get("error")) == str(b.get("error"))
+                    _record(records, case, f"{check}/error", 0 if same else np.inf, 0, **fctx)
+                    continue
+                same_pick = all(a[c] == b[c] for c in best_cols)
+                train_gap = _max_abs(a["train_ann_return"], b["train_ann_return"])
+                # a different pick is acceptable only as a tie on the selection metric
+                _record(records, case, f"{check}/selection", 0 if same_pick else train_gap, TOL[precision], **fctx)
+                if same_pick:
+                    for k in WALKFORWARD_STATS:
+                        _record(records, case, f"{check}/{k}", _max_abs(a[k], b[k]), TOL[precision], **fctx)
+
+
+def run_harness(n_cases: int = 10, seed: int = 0, kinds: Optional[List[str]] = None, walkforward: bool = True) -> pd.DataFrame:
+    """Run all checks on n_cases synthetic histories per kind; returns one row per comparison."""
+    records: List[dict] = []
+    for kind in kinds or KINDS:
+        for s in range(seed, seed + n_cases):
+            df = make_prices(kind, s)
+            case = {"kind": kind, "seed": s, "bars": len(df)}
+            rng = np.random.default_rng([KINDS.index(kind), s, 1])
+            # the batched kernels require NaN-free prices (grid_search_train falls back to
+            # pandas otherwise), so NaN cases are covered through the walk-forward check only
+            if len(df) and not df[["Open", "Close"]].isna().to_numpy().any():
+                check_components(df, case, rng, records)
+            if walkforward:
+                check_walkforward(df, case, rng, records)
+    return pd.DataFrame(records)
+
+
+def summarize(report: pd.DataFrame, top: int = 10) -> Dict[str, pd.DataFrame]:
+    """Per-check counts/max error (plus tolerated tie flips), and the worst cases by error / tolerance."""
+    if "tied_flips" not in report:
+        report = report.assign(tied_flips=np.nan)
+    per_check = report.groupby("check").agg(
+        comparisons=("passed", "size"), failures=("passed", lambda p: int((~p).sum())), max_error=("error", "max"), tol=("tol", "first"),
+        tied_flips=("tied_flips", "sum"),
+    )
+    ratio = report["error"] / report["tol"].where(report["tol"] > 0, 1.0)
+    worst = report.assign(ratio=ratio).sort_values("ratio", ascending=False).head(top).drop(columns="ratio")
+    return {"per_check": per_check, "worst": worst}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Check batched/compact engines against the pandas reference")
+    p.add_argument("--cases", type=int, default=10, help="Synthetic histories per kind")
+    p.add_argument("--seed", type=int, default=0, help="First seed")
+    p.add_argument("--kinds", default=",".join(KINDS), help=f"Comma-separated generators ({', '.join(KINDS)})")
+    p.add_argument("--no-walkforward", dest="walkforward", action="store_false", help="Skip the (slower) walk-forward comparison")
+    p.add_argument("--top", type=int, default=10, help="Worst cases to print")
+    p.add_argument("--out", default=None, help="Optional CSV path for the full comparison table")
+    args = p.parse_args()
+
+    # overflowing leveraged paths produce NaN stats in both engines; the comparison handles them
+    warnings.simplefilter("ignore", RuntimeWarning)
+    report = run_harness(args.cases, seed=args.seed, kinds=[k.strip() for k in args.kinds.split(",") if k.strip()], walkforward=args.walkforward)
+    if args.out:
+        report.to_csv(args.out, index=False)
+    tables = summarize(report, top=args.top)
+    print(tables["per_check"].to_string())
+    print("\nWorst cases:")
+    print(tables["worst"].to_string(index=False))
+    failures = int((~report["passed"]).sum())
+    print(f"\n{failures} failing comparisons out of {len(report)}")
+    sys.exit(1 if failures else 0)
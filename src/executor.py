@@ -0,0 +1,319 @@
+"""Pluggable executors for the per-ticker walk-forward work units of run_aggregate.
+
+A WorkUnit is (ticker, strategy, price reference, config): workers load prices from the
+reference (a data folder on shared storage, or a download start date) instead of
+receiving pickled DataFrames, so units stay a few hundred bytes wherever they run.
+
+- LocalExecutor: in-process (max_workers=1) or a process pool on this machine.
+- FileQueueExecutor: a work queue on a shared filesystem. Any number of nodes run
+  `python src/executor.py worker /shared/queue`; local_workers=N starts N worker
+  processes on this machine as a stand-in for a cluster.
+
+Each executor's run(units) yields (index, unit, result) as units finish, where result is
+run_unit's dict of frames or the exception raised by the unit.
+"""
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import lru_cache
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+import pandas as pd
+
+from data import download_prices, load_prices, infer_periods_per_year
+from walkforward import run_walkforward_for_ticker
+from robustness import bootstrap_walkforward
+from strategies import get_strategy
+from memory import MemoryMonitor, plan_unit
+
+
+class PriceRef(NamedTuple):
+    """Where a worker finds prices: <data_dir>/<TICKER>.csv|.parquet, or a download from start.
+
+    chunksize streams CSV rows in chunks of that size when resampling to bar.
+    """
+    data_dir: Optional[str] = None
+    bar: Optional[str] = None
+    start: str = "2012-01-01"
+    chunksize: Optional[int] = None
+
+
+class WorkUnit(NamedTuple):
+    ticker: str
+    strategy: str
+    prices: PriceRef
+    # run_walkforward_for_ticker kwargs plus n_bootstrap/n_jobs/seed for the robustness pass
+    # and max_memory (bytes available to this unit)
+    config: dict
+
+
+Result = Union[Dict[str, pd.DataFrame], Exception]
+
+
+@lru_cache(maxsize=2)
+def _load(prices: PriceRef, ticker: str) -> pd.DataFrame:
+    # per-process cache: consecutive units of the same ticker (one per strategy) share one load
+    if prices.data_dir is None:
+        return download_prices(ticker, start=prices.start)
+    path = os.path.join(prices.data_dir, f"{ticker}.parquet")
+    if not os.path.exists(path):
+        path = os.path.join(prices.data_dir, f"{ticker}.csv")
+    return load_prices(path, resample=prices.bar, chunksize=prices.chunksize).loc[prices.start:]
+
+
+def run_unit(unit: WorkUnit) -> Dict[str, pd.DataFrame]:
+    """Run walk-forward (and optional bootstrap) for one unit.
+
+    Returns a dict with 'summary' and, when requested, 'regimes', 'surface', 'robustness'.
+    With config['max_memory'], batched grids and bootstrap passes are sized to that budget
+    (memory.plan_unit) and 'memory' holds the RSS of the load/walkforward/bootstrap stages.
+    """
+    cfg = dict(unit.config)
+    n_bootstrap = cfg.pop("n_bootstrap", 0)
+    n_jobs = cfg.pop("n_jobs", 1)
+    seed = cfg.pop("seed", None)
+    max_memory = cfg.pop("max_memory", None)
+    monitor = MemoryMonitor() if max_memory is not None else None
+
+    def stage(name: str):
+        return monitor.stage(name, **plan) if monitor else nullcontext()
+
+    plan: dict = {}
+    with stage("load"):
+        df = _load(PriceRef(*unit.prices), unit.ticker)
+    if max_memory is not None:
+        strat = get_strategy(unit.strategy)
+        n_params = sum(strat.valid(tuple(p)) for p in (cfg.get("grid") or strat.default_grid))
+        plan = plan_unit(len(df), n_params, max_memory, cfg.get("precision", "float64"), cfg.get("vol_target"), n_bootstrap)
+        cfg["grid_batch"] = plan["grid_batch"]
+        plan = {"bars": len(df), "budget_mb": max_memory / 2**20, "estimate_mb": plan.pop("estimate") / 2**20, **plan}
+    resample_batch = plan.get("resample_batch")
+    ppy = cfg.pop("periods_per_year", None) or infer_periods_per_year(df.index)
+    with stage("walkforward"):
+        result = run_walkforward_for_ticker(df, periods_per_year=ppy, strategy=unit.strategy, **cfg)
+    frames = list(result) if isinstance(result, tuple) else [result]
+    out = {"summary": frames.pop(0)}
+    if cfg.get("compute_regimes"):
+        out["regimes"] = frames.pop(0)
+    if cfg.get("keep_surface"):
+        out["surface"] = frames.pop(0)
+    if n_bootstrap > 0:
+        keys = ["execution", "fee_bps", "slippage_bps", "precision", "vol_target", "max_leverage"]
+        with stage("bootstrap"):
+            out["robustness"] = bootstrap_walkforward(
+                df, n_resamples=n_bootstrap, n_jobs=n_jobs, seed=seed, periods_per_year=ppy, strategy=unit.strategy,
+                resample_batch=resample_batch, **{k: cfg[k] for k in keys if k in cfg},
+            )
+    if monitor:
+        out["memory"] = monitor.frame()
+    return out
+
+
+def _try_run(unit: WorkUnit) -> Result:
+    try:
+        return run_unit(unit)
+    except Exception as e:
+        return e
+
+
+class LocalExecutor:
+    """Run units in this process (max_workers=1) or on a local process pool (None = all CPUs)."""
+
+    def __init__(self, max_workers: Optional[int] = 1):
+        self.max_workers = max_workers
+
+    def run(self, units: List[WorkUnit]) -> Iterator[Tuple[int, WorkUnit, Result]]:
+        if self.max_workers == 1:
+            for i, unit in enumerate(units):
+                yield i, unit, _try_run(unit)
+            return
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(_try_run, unit): i for i, unit in enumerate(units)}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                yield i, units[i], fut.result()
+
+
+# --- shared-filesystem work queue ---------------------------------------------------
+#
+# <queue_dir>/pending/<id>.json   submitted units
+# <queue_dir>/running/<id>.json   claimed by a worker (atomic rename), touched as a heartbeat
+# <queue_dir>/done/<id>.pkl       pickled run_unit result or exception
+
+QUEUE_DIRS = ("pending", "running", "done")
+
+
+def _init_queue(queue_dir: str):
+    for d in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, d), exist_ok=True)
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _encode_unit(unit: WorkUnit) -> bytes:
+    return json.dumps({"ticker": unit.ticker, "strategy": unit.strategy, "prices": unit.prices._asdict(), "config": unit.config}).encode()
+
+
+def _decode_unit(data: bytes) -> WorkUnit:
+    d = json.loads(data)
+    return WorkUnit(d["ticker"], d["strategy"], PriceRef(**d["prices"]), d["config"])
+
+
+def _heartbeat(path: str, stop: threading.Event, interval: float):
+    while not stop.wait(interval):
+        try:
+            os.utime(path)
+        except OSError:
+            return
+
+
+def work(queue_dir: str, poll_interval: float = 1.0, heartbeat: float = 30.0, idle_exit: Optional[float] = None) -> int:
+    """Worker loop: claim pending units, run them and write results; returns units processed.
+
+    Claims are atomic renames into running/, so any number of workers on any number of
+    nodes can share queue_dir. Stops after idle_exit seconds without work (None = never).
+    """
+    _init_queue(queue_dir)
+    pending = os.path.join(queue_dir, "pending")
+    processed = 0
+    idle_since = time.monotonic()
+    while True:
+        claimed = None
+        for name in sorted(os.listdir(pending)):
+            if not name.endswith(".json"):
+                continue
+            running = os.path.join(queue_dir, "running", name)
+            try:
+                os.rename(os.path.join(pending, name), running)
+            except OSError:
+                continue  # another worker got it
+            os.utime(running)
+            claimed = name, running
+            break
+        if claimed is None:
+            if idle_exit is not None and time.monotonic() - idle_since > idle_exit:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        name, running = claimed
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(running, stop, heartbeat), daemon=True).start()
+        try:
+            with open(running, "rb") as f:
+                unit = _decode_unit(f.read())
+            result = _try_run(unit)
+        except Exception as e:
+            result = e
+        finally:
+            stop.set()
+        try:
+            data = pickle.dumps(result)
+        except Exception as e:
+            data = pickle.dumps(RuntimeError(f"unpicklable result: {e}"))
+        _write_atomic(os.path.join(queue_dir, "done", name[: -len(".json")] + ".pkl"), data)
+        try:
+            os.remove(running)
+        except OSError:
+            pass
+        processed += 1
+        idle_since = time.monotonic()
+
+
+class FileQueueExecutor:
+    """Distribute units through a work queue on a shared filesystem.
+
+    Units whose running/ entry has not been touched for lease seconds (a dead worker)
+    are put back in pending/. local_workers starts that many worker processes here for
+    the duration of run(); with 0 the queue relies on workers started on other nodes.
+    """
+
+    def __init__(self, queue_dir: str, local_workers: int = 0, poll_interval: float = 0.5, lease: float = 300.0, timeout: Optional[float] = None):
+        self.queue_dir = queue_dir
+        self.local_workers = local_workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.timeout = timeout
+
+    def _requeue_stale(self, ids: Dict[str, int]):
+        running = os.path.join(self.queue_dir, "running")
+        now = time.time()
+        for uid in ids:
+            path = os.path.join(running, f"{uid}.json")
+            try:
+                if now - os.path.getmtime(path) > self.lease:
+                    os.rename(path, os.path.join(self.queue_dir, "pending", f"{uid}.json"))
+            except OSError:
+                pass
+
+    def run(self, units: List[WorkUnit]) -> Iterator[Tuple[int, WorkUnit, Result]]:
+        _init_queue(self.queue_dir)
+        run_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        ids: Dict[str, int] = {}
+        for i, unit in enumerate(units):
+            uid = f"{run_id}-{i:06d}"
+            _write_atomic(os.path.join(self.queue_dir, "pending", f"{uid}.json"), _encode_unit(unit))
+            ids[uid] = i
+        # heartbeats must land well inside the lease
+        procs = [
+            multiprocessing.Process(target=work, args=(self.queue_dir,), kwargs={"poll_interval": self.poll_interval, "heartbeat": self.lease / 4}, daemon=True)
+            for _ in range(self.local_workers)
+        ]
+        for p in procs:
+            p.start()
+        started = time.monotonic()
+        last_check = started
+        try:
+            while ids:
+                done = os.path.join(self.queue_dir, "done")
+                for uid in [u for u in ids if os.path.exists(os.path.join(done, f"{u}.pkl"))]:
+                    path = os.path.join(done, f"{uid}.pkl")
+                    with open(path, "rb") as f:
+                        result = pickle.load(f)
+                    os.remove(path)
+                    i = ids.pop(uid)
+                    yield i, units[i], result
+                if not ids:
+                    break
+                if self.timeout is not None and time.monotonic() - started > self.timeout:
+                    raise TimeoutError(f"{len(ids)} work units still pending in {self.queue_dir}")
+                if time.monotonic() - last_check > self.lease / 4:
+                    self._requeue_stale(ids)
+                    last_check = time.monotonic()
+                time.sleep(self.poll_interval)
+        finally:
+            # withdraw anything of this run still queued and stop the local stand-in workers
+            for uid in ids:
+                try:
+                    os.remove(os.path.join(self.queue_dir, "pending", f"{uid}.json"))
+                except OSError:
+                    pass
+            for p in procs:
+                p.terminate()
+                p.join()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run a walk-forward worker on a shared work queue")
+    p.add_argument("command", choices=["worker"], help="'worker': process units from the queue until stopped")
+    p.add_argument("queue_dir", help="Shared queue folder (same path as --queue-dir of the driver)")
+    p.add_argument("--poll", type=float, default=1.0, help="Seconds between queue scans when idle")
+    p.add_argument("--idle-exit", type=float, default=None, help="Exit after this many idle seconds (default: run forever)")
+    args = p.parse_args()
+    n = work(args.queue_dir, poll_interval=args.poll, idle_exit=args.idle_exit)
+    print(f"Processed {n} work units")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Memory budget helpers: footprint estimates, batch sizing and per-stage RSS reporting.
+
+Estimates are deliberately rough (bytes per bar, bytes per grid cell) and only used to
+size batches; batched_in() additionally halves a batch and retries on MemoryError, so a
+tight budget degrades to smaller batches instead of failing the run.
+"""
+from typing import Callable, Dict, List, Optional
+from contextlib import contextmanager
+import gc
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from batched import PRECISIONS
+
+
+# pandas path: price frame plus signal/backtest copies (~30 float64 columns)
+FRAME_BYTES_PER_BAR = 256
+# bootstrap paths: resample indices plus growth/close/open paths, per resample and bar
+PATH_BYTES_PER_BAR = 48
+# interpreter + numpy/pandas of each extra worker process
+PROCESS_BYTES = 150 * 2**20
+TRADING_HOURS_PER_DAY = 6.5
+_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+
+def parse_size(text: str) -> int:
+    """Bytes from a size such as '512M', '4G', '1.5g' or a plain byte count."""
+    m = re.fullmatch(r"\s*([0-9.]+)\s*([KMGT]?)I?B?\s*", str(text).upper())
+    if m is None:
+        raise ValueError(f"Invalid memory size: {text}")
+    return int(float(m.group(1)) * _UNITS[m.group(2)])
+
+
+def _status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss() -> Optional[int]:
+    """Current resident set size in bytes (None where /proc is unavailable)."""
+    return _status_kb("VmRSS")
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size in bytes, since the last reset_peak() where supported."""
+    peak = _status_kb("VmHWM")
+    if peak is None:
+        try:
+            import resource
+        except ImportError:
+            return None
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return peak
+
+
+def reset_peak() -> bool:
+    """Reset the kernel's peak RSS counter (Linux); False when not permitted."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MemoryMonitor:
+    """Records RSS at the start/end and peak RSS of named stages.
+
+    When the peak counter cannot be reset, peak_rss_mb is the process high-water mark
+    so far (peak_since_start=True).
+    """
+
+    def __init__(self):
+        self.rows: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str, **info):
+        resettable = reset_peak()
+        start = rss()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            end, peak = rss(), peak_rss()
+            self.rows.append({
+                "stage": name,
+                **info,
+                "rss_start_mb": _mb(start),
+                "rss_end_mb": _mb(end),
+                "peak_rss_mb": _mb(peak),
+                "peak_since_start": not resettable,
+                "seconds": time.perf_counter() - t0,
+            })
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.rows)
+
+
+def _mb(n: Optional[int]) -> float:
+    return np.nan if n is None else n / 2**20
+
+
+# --- footprint estimates ------------------------------------------------------------
+
+def bars_per_year(bar: Optional[str] = None, periods_per_year: Optional[int] = None) -> int:
+    """Bars per year of a run: periods_per_year, else derived from the resample rule (daily default)."""
+    if periods_per_year:
+        return periods_per_year
+    try:
+        step = pd.Timedelta(bar) if bar else None
+    except ValueError:
+        # calendar rules such as 'W' or 'M'; daily is an upper bound
+        step = None
+    if step is not None and step < pd.Timedelta(days=1):
+        return int(252 * pd.Timedelta(hours=TRADING_HOURS_PER_DAY) / step)
+    return 252
+
+
+def grid_cell_bytes(precision: str = "float64", vol_target: Optional[float] = None) -> int:
+    """Bytes per (param, bar) cell of batched.evaluate_grid.
+
+    Signal (bool), positions and turnover (int8 for compact unscaled positions), the
+    return/cost temporaries and strat_ret, plus float64 equity/peak in stats_matrix.
+    """
+    item = np.dtype(PRECISIONS[precision]).itemsize
+    pos = item if vol_target is not None else (1 if precision == "float32" else 8)
+    return 1 + 2 * pos + 3 * item + 3 * 8
+
+
+def unit_bytes(n_bars: int, n_params: int, engine: str = "pandas", precision: str = "float64", vol_target: Optional[float] = None, n_bootstrap: int = 0, bootstrap_chunk: int = 250, grid_batch: Optional[int] = None, resample_batch: Optional[int] = None) -> int:
+    """Estimated peak bytes of one (ticker, strategy) work unit above the interpreter."""
+    total = n_bars * FRAME_BYTES_PER_BAR
+    cell = grid_cell_bytes(precision, vol_target)
+    if engine == "batched":
+        total += min(grid_batch or n_params, n_params) * n_bars * cell
+    if n_bootstrap > 0:
+        rows = min(resample_batch or bootstrap_chunk, bootstrap_chunk, n_bootstrap)
+        total += min(bootstrap_chunk, n_bootstrap) * n_bars * PATH_BYTES_PER_BAR + rows * n_params * n_bars * cell
+    return total
+
+
+def plan_unit(n_bars: int, n_params: int, budget: int, precision: str = "float64", vol_target: Optional[float] = None, n_bootstrap: int = 0, bootstrap_chunk: int = 250) -> Dict[str, int]:
+    """Batch sizes of one work unit under budget bytes, and the resulting estimate.
+
+    bootstrap_chunk is bootstrap_walkforward's chunk_size (resamples per seeded chunk); it
+    is left alone so bootstrap draws do not depend on the budget. Batches never drop
+    below 1, so estimate can exceed budget on very long histories.
+    """
+    base = n_bars * FRAME_BYTES_PER_BAR
+    cell = grid_cell_bytes(precision, vol_target)
+    paths = min(bootstrap_chunk, n_bootstrap) * n_bars * PATH_BYTES_PER_BAR
+    grid_batch = fit_batch(budget - base, n_bars * cell, n_params)
+    resample_batch = fit_batch(budget - base - paths, n_params * n_bars * cell, bootstrap_chunk)
+    estimate = unit_bytes(n_bars, n_params, "batched", precision, vol_target, n_bootstrap, bootstrap_chunk, grid_batch, resample_batch)
+    return {"grid_batch": grid_batch, "resample_batch": resample_batch, "estimate": estimate}
+
+
+def fit_batch(budget: int, per_item: int, n_items: int) -> int:
+    """Largest batch (1..n_items) of items costing per_item bytes each that fits budget."""
+    if per_item <= 0:
+        return max(n_items, 1)
+    return int(min(max(budget // per_item, 1), max(n_items, 1)))
+
+
+def batched_in(fn: Callable[[int, int], object], n: int, batch: Optional[int] = None) -> List[object]:
+    """Call fn(lo, hi) over [0, n) in slices of at most batch (None = all at once).
+
+    On MemoryError the slice is halved and retried, down to a single item, so results
+    are the same as one full call only slower.
+    """
+    batch = max(int(batch or n), 1)
+    out = []
+    lo = 0
+    while lo < n:
+        hi = min(n, lo + batch)
+        try:
+            out.append(fn(lo, hi))
+        except MemoryError:
+            if hi - lo <= 1:
+                raise
+            batch = (hi - lo) // 2
+            gc.collect()
+            continue
+        lo = hi
+    return out
+
+
+def plan_workers(budget: int, requested: Optional[int], unit_min: int, baseline: Optional[int] = None) -> Dict[str, int]:
+    """Split a run budget into concurrent workers and a per-unit budget.
+
+    baseline is the driver's current RSS; every worker process beyond the first also
+    costs PROCESS_BYTES. Workers are reduced until each gets at least unit_min.
+    """
+    baseline = rss() if baseline is None else baseline
+    available = max(budget - (baseline or 0), 0)
+    workers = requested or os.cpu_count() or 1
+    while workers > 1 and (available - (workers - 1) * PROCESS_BYTES) // workers < unit_min:
+        workers -= 1
+    per_unit = (available - (workers - 1) * PROCESS_BYTES) // workers if workers > 1 else available
+    return {"workers": workers, "unit_budget": int(per_unit)}
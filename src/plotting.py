@@ -4,55 +4,6 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 
-def ensure_dir(path: str):
-    os.makedirs(path, exist_ok=True)
-
-
-def plot_regime_performance(regimes_df: pd.DataFrame, ticker: str = "TICK", execution: str = "close", outdir: Optional[str] = "results/figures") -> str:
-    # Save a figure summarizing per-regime ann returns
-    ensure_dir(outdir)
-    fig_path = os.path.join(outdir, f"{ticker}_{execution}_regimes.png")
-    if regimes_df is None or len(regimes_df) == 0:
-        raise ValueError("regimes_df is empty; no regime data to plot")
-    if "regime" not in regimes_df.columns:
-        raise ValueError("regimes_df must contain a 'regime' column")
-    agg = regimes_df.groupby("regime")["ann_return"].agg(["mean", "std", "count"]).reset_index()
-    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
-    axes[0].bar(agg["regime"].astype(str), agg["mean"], yerr=agg["std"], capsize=5)
-    axes[0].set_title(f"Mean test ann return by regime ({ticker} {execution})")
-    axes[0].set_xlabel("Regime (1=low vol)")
-    axes[0].set_ylabel("Annualized return")
-    regimes_df.boxplot(column="ann_return", by="regime", ax=axes[1])
-    axes[1].set_title("Distribution of ann returns by regime (per fold)")
-    axes[1].set_xlabel("Regime")
-    axes[1].set_ylabel("Annualized return")
-    plt.suptitle("")
-    plt.tight_layout()
-    fig.savefig(fig_path)
-    plt.close(fig)
-    return fig_path
-
-
-def plot_aggregate_returns(summary_df: pd.DataFrame, outdir: Optional[str] = "results/figures") -> str:
-    # Save a bar chart of mean OOS annual return per ticker
-    ensure_dir(outdir)
-    fig_path = os.path.join(outdir, "aggregate_oos_returns.png")
-    agg = summary_df.groupby("ticker")["test_ann_return"].mean().sort_values(ascending=False)
-    fig, ax = plt.subplots(figsize=(8, 4))
-    agg.plot.bar(ax=ax)
-    ax.set_title("Mean OOS annual return by ticker (walk-forward)")
-    ax.set_ylabel("Annualized return")
-    ax.set_xlabel("")
-    plt.tight_layout()
-    fig.savefig(fig_path)
-    plt.close(fig)
-    return fig_path
-import os
-from typing import Optional
-import pandas as pd
-import matplotlib.pyplot as plt
-
-
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
@@ -102,7 +53,11 @@ def plot_aggregate_returns(summary_df: pd.DataFrame, outdir: Optional[str] = "re
     ensure_dir(outdir)
     fig_path = os.path.join(outdir, "aggregate_oos_returns.png")
 
-    agg = summary_df.groupby("ticker")["test_ann_return"].mean().sort_values(ascending=False)
+    if "strategy" in summary_df.columns and summary_df["strategy"].nunique() > 1:
+        # one bar per strategy within each ticker
+        agg = summary_df.groupby(["ticker", "strategy"])["test_ann_return"].mean().unstack("strategy")
+    else:
+        agg = summary_df.groupby("ticker")["test_ann_return"].mean().sort_values(ascending=False)
 
     fig, ax = plt.subplots(figsize=(8, 4))
     agg.plot.bar(ax=ax)
@@ -113,3 +68,56 @@ def plot_aggregate_returns(summary_df: pd.DataFrame, outdir: Optional[str] = "re
     fig.savefig(fig_path)
     plt.close(fig)
     return fig_path
+
+
+def plot_param_surface(surface_df: pd.DataFrame, ticker: str = "TICK", execution: str = "close", outdir: Optional[str] = "results/figures", summary_df: Optional[pd.DataFrame] = None) -> str:
+    """Plot one heatmap of train ann_return per walk-forward fold and save figure.
+
+    Expects surface_df in the long format produced by run_walkforward_for_ticker(keep_surface=True)
+    (columns: train_start, one column per parameter, train_ann_return). The heatmap axes are the
+    first two parameters (e.g. fast x slow); further parameters are reduced by taking the best
+    cell. If summary_df is given, the selected best_<param> of each fold is marked.
+    """
+    ensure_dir(outdir)
+    fig_path = os.path.join(outdir, f"{ticker}_{execution}_surface.png")
+
+    if surface_df is None or len(surface_df) == 0:
+        raise ValueError("surface_df is empty; no grid surface to plot")
+
+    meta = {"train_start", "train_end", "test_start", "test_end", "train_ann_return", "ticker", "strategy"}
+    param_cols = [c for c in surface_df.columns if c not in meta]
+    if len(param_cols) < 2:
+        raise ValueError("surface_df needs at least two parameter columns")
+    y_col, x_col = param_cols[:2]
+
+    folds = sorted(surface_df["train_start"].unique())
+    # shared colour scale so plateaus/spikes are comparable across folds
+    vmin = surface_df["train_ann_return"].min()
+    vmax = surface_df["train_ann_return"].max()
+    ncols = min(len(folds), 3)
+    nrows = (len(folds) + ncols - 1) // ncols
+    fig, axes = plt.subplots(nrows, ncols, figsize=(5 * ncols, 4 * nrows), squeeze=False)
+
+    for ax, fold in zip(axes.flat, folds):
+        grid = surface_df[surface_df["train_start"] == fold].pivot_table(index=y_col, columns=x_col, values="train_ann_return", aggfunc="max", dropna=False)
+        im = ax.imshow(grid.values, origin="lower", aspect="auto", cmap="viridis", vmin=vmin, vmax=vmax)
+        ax.set_xticks(range(len(grid.columns)))
+        ax.set_xticklabels(grid.columns, fontsize=7)
+        ax.set_yticks(range(len(grid.index)))
+        ax.set_yticklabels(grid.index, fontsize=7)
+        ax.set_xlabel(x_col)
+        ax.set_ylabel(y_col)
+        ax.set_title(f"Train from {pd.Timestamp(fold).date()}")
+        best_y, best_x = f"best_{y_col}", f"best_{x_col}"
+        if summary_df is not None and best_y in summary_df.columns and best_x in summary_df.columns:
+            chosen = summary_df[summary_df["train_start"] == fold].dropna(subset=[best_y, best_x])
+            for _, r in chosen.iterrows():
+                ax.plot(list(grid.columns).index(r[best_x]), list(grid.index).index(r[best_y]), "rx", markersize=10)
+    for ax in axes.flat[len(folds):]:
+        ax.axis("off")
+
+    fig.colorbar(im, ax=axes.ravel().tolist(), label="Train annualized return")
+    fig.suptitle(f"Parameter surface by fold ({ticker} {execution})")
+    fig.savefig(fig_path)
+    plt.close(fig)
+    return fig_path
@@ -0,0 +1,60 @@
+"""Validation harness for the float32 precision mode of the batched engine.
+
+Runs every walk-forward train grid in float64 and float32 and reports the worst
+deviation in reported stats plus whether the selected (fast, slow) pair changed.
+
+Usage: python src/precision.py SPY QQQ
+"""
+from typing import List, Optional
+import sys
+import numpy as np
+import pandas as pd
+
+import batched
+from strategies import get_strategy
+from walkforward import rolling_splits, slice_window
+
+
+STAT_KEYS = ["ann_return", "ann_vol", "sharpe", "max_drawdown"]
+
+
+def _best(ann: np.ndarray) -> int:
+    return int(np.argmax(np.where(np.isnan(ann), -np.inf, ann)))
+
+
+def compare_precision(df: pd.DataFrame, grid: Optional[List[tuple]] = None, train_years: int = 7, test_years: int = 3, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0, strategy: str = "ema_cross") -> pd.DataFrame:
+    """Compare float32 vs float64 batched grid stats on each walk-forward train window.
+
+    Returns one row per fold with max_abs_<stat> (over all parameter tuples) and
+    selection_match. Signals are float64 in both modes (see batched.PRECISIONS), so any
+    deviation comes from the float32 returns/positions blocks.
+    """
+    strat = get_strategy(strategy)
+    pairs = [tuple(p) for p in (grid if grid is not None else strat.default_grid) if strat.valid(tuple(p))]
+    rows = []
+    for train_start, train_end, test_start, test_end in rolling_splits(pd.to_datetime(df.index), train_years=train_years, test_years=test_years):
+        train_df = slice_window(df, train_start, train_end)
+        close = train_df["Close"].to_numpy(dtype=float)
+        open_ = train_df["Open"].to_numpy(dtype=float) if execution == "open" else None
+        ref = batched.evaluate_grid(close, pairs, open_=open_, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps, signal_fn=strat.batch_signals)
+        low = batched.evaluate_grid(close, pairs, open_=open_, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps, precision="float32", signal_fn=strat.batch_signals)
+        row = {
+            "train_start": train_start,
+            "train_end": train_end,
+            "bars": len(train_df),
+            "pairs": len(pairs),
+            "selection_match": _best(ref["ann_return"]) == _best(low["ann_return"]),
+        }
+        for k in STAT_KEYS:
+            row[f"max_abs_{k}"] = float(np.nanmax(np.abs(ref[k] - low[k]))) if len(pairs) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from data import download_prices
+
+    for ticker in sys.argv[1:] or ["SPY"]:
+        report = compare_precision(download_prices(ticker))
+        print(ticker)
+        print(report.to_string(index=False))
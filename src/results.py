@@ -1,16 +1,43 @@
 from typing import List, Optional
+from contextlib import nullcontext
 import os
 import pandas as pd
 
-from data import download_universe
-from walkforward import run_walkforward_for_ticker
-from plotting import plot_aggregate_returns, plot_regime_performance
+from executor import LocalExecutor, PriceRef, WorkUnit
+from memory import MemoryMonitor, bars_per_year, plan_workers, unit_bytes
+from strategies import get_strategy
+from plotting import plot_aggregate_returns, plot_regime_performance, plot_param_surface
 
 
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
 
+def _concat_csv_files(paths: List[str], out_path: str):
+    # stream per-ticker CSVs into one file: union of columns in order of appearance,
+    # then one file at a time, so the aggregate never has to fit in memory
+    headers = [list(pd.read_csv(path, nrows=0).columns) for path in paths]
+    columns: List[str] = []
+    for header in headers:
+        columns.extend(c for c in header if c not in columns)
+    # like pd.concat, integer columns missing from some files become float
+    partial = {c for c in columns if any(c not in header for header in headers)}
+    for k, path in enumerate(paths):
+        df = pd.read_csv(path, float_precision="round_trip")
+        for c in partial.intersection(df.columns):
+            if pd.api.types.is_integer_dtype(df[c]):
+                df[c] = df[c].astype(float)
+        df.reindex(columns=columns).to_csv(out_path, mode="w" if k == 0 else "a", header=k == 0, index=False)
+
+
+def _write_all(items: list, out_path: str):
+    # items are frames, or CSV paths when running under a memory budget
+    if items and isinstance(items[0], str):
+        _concat_csv_files(items, out_path)
+    else:
+        pd.concat(items, ignore_index=True).to_csv(out_path, index=False)
+
+
 def run_aggregate(
     universe: List[str],
     start: str = "2012-01-01",
@@ -19,6 +46,21 @@ def run_aggregate(
     slippage_bps: float = 0.0,
     compute_regimes: bool = True,
     outdir: Optional[str] = None,
+    n_bootstrap: int = 0,
+    n_jobs: Optional[int] = 1,
+    engine: str = "pandas",
+    keep_surface: bool = False,
+    precision: str = "float64",
+    data_dir: Optional[str] = None,
+    bar: Optional[str] = None,
+    periods_per_year: Optional[int] = None,
+    strategies: Optional[List[str]] = None,
+    vol_target: Optional[float] = None,
+    max_leverage: float = 1.0,
+    executor=None,
+    max_memory: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    seed: Optional[int] = None,
 ) -> str:
     """Run walk-forward for each ticker, aggregate results, and save CSVs/figures.
 
@@ -30,61 +72,131 @@ def run_aggregate(
         slippage_bps: slippage in basis points
         compute_regimes: whether to compute regime-level breakdown
         outdir: output folder (defaults to 'results' if None)
+        n_bootstrap: bootstrap resamples per fold for robustness CSVs (0 disables)
+        n_jobs: worker processes for bootstrap resampling (None = all CPUs)
+        engine: grid-search engine, 'pandas' (reference) or 'batched'
+        keep_surface: save the full (fast x slow) train surface per fold and its heatmaps
+        precision: 'float64' (reference) or 'float32' compact dtypes for the batched paths
+        data_dir: load <data_dir>/<TICKER>.csv|.parquet (daily or intraday) instead of downloading
+        bar: optional resample rule for local bars, e.g. '5min', '1h', '1D'
+        periods_per_year: annualization factor; inferred per ticker from bar spacing if None
+        strategies: names from strategies.STRATEGIES to run side by side (default ['ema_cross'])
+        vol_target: annualized volatility target for position sizing (None = unscaled 0/1 positions)
+        max_leverage: cap on the vol-targeted exposure
+        executor: runs the (ticker, strategy) work units, e.g. executor.LocalExecutor(max_workers=8)
+            or executor.FileQueueExecutor(queue_dir) (default: in-process, one unit at a time)
+        max_memory: run budget in bytes. Local workers are reduced until each unit's estimated
+            footprint fits, batched grids and bootstrap passes are sized to the per-unit share,
+            regime/surface/robustness aggregates are streamed from disk, and peak RSS per stage
+            is written to memory_all_<execution>.csv. Bootstrap then runs in-process (n_jobs=1).
+            Remote (queue) workers get the whole budget for their unit.
+        chunksize: with data_dir and bar, stream local CSVs in chunks of this many rows and
+            resample each chunk, so the full-resolution file is never held in memory
+        seed: bootstrap seed, so robustness CIs are reproducible (None = fresh entropy)
 
     Returns:
         Path to the output folder used to store CSVs and figures.
     """
     if outdir is None:
         outdir = "results"
+    if not strategies:
+        strategies = ["ema_cross"]
     ensure_dir(outdir)
     figures = os.path.join(outdir, "figures")
     ensure_dir(figures)
 
-    all_summaries = []
-    all_regimes = []
+    monitor = MemoryMonitor() if max_memory else None
+    unit_budget = None
+    if max_memory:
+        # footprint from the expected history length and the largest grid, at the smallest batches
+        years = max((pd.Timestamp.today() - pd.Timestamp(start)).days / 365.25, 1.0)
+        n_bars = int(bars_per_year(bar, periods_per_year) * years)
+        n_params = max(sum(s.valid(tuple(p)) for p in s.default_grid) for s in map(get_strategy, strategies))
+        unit_min = unit_bytes(n_bars, n_params, engine, precision, vol_target, n_bootstrap, grid_batch=1, resample_batch=1)
+        if executor is None or isinstance(executor, LocalExecutor):
+            plan = plan_workers(max_memory, executor.max_workers if executor else 1, unit_min)
+            executor = LocalExecutor(max_workers=plan["workers"])
+            unit_budget = plan["unit_budget"]
+        else:
+            unit_budget = max_memory
+        n_jobs = 1
+        print(f"Memory budget {max_memory / 2**20:.0f} MB: {getattr(executor, 'max_workers', 1)} worker(s), {unit_budget / 2**20:.0f} MB per unit (~{n_bars} bars, {n_params} params)")
+        if unit_budget < unit_min:
+            print(f"Warning: estimated minimum footprint {unit_min / 2**20:.0f} MB per unit exceeds the budget; running with the smallest batches")
 
-    data = download_universe(universe, start=start)
-    for ticker, df in data.items():
-        try:
-            if compute_regimes:
-                summary, regimes = run_walkforward_for_ticker(
-                    df, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps, compute_regimes=True
-                )
-                summary["ticker"] = ticker
-                regimes["ticker"] = ticker
-                summary.to_csv(os.path.join(outdir, f"summary_{ticker}_{execution}.csv"), index=False)
-                regimes.to_csv(os.path.join(outdir, f"regimes_{ticker}_{execution}.csv"), index=False)
-                try:
-                    plot_regime_performance(regimes, ticker=ticker, execution=execution, outdir=figures)
-                except Exception:
-                    pass
-                all_summaries.append(summary)
-                all_regimes.append(regimes)
-            else:
-                summary = run_walkforward_for_ticker(
-                    df, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps, compute_regimes=False
-                )
-                summary["ticker"] = ticker
-                summary.to_csv(os.path.join(outdir, f"summary_{ticker}_{execution}.csv"), index=False)
-                all_summaries.append(summary)
-        except Exception as e:
-            print(f"{ticker} failed: {e}")
+    units = [
+        WorkUnit(ticker, strategy, PriceRef(data_dir, bar, start, chunksize), {
+            "execution": execution, "fee_bps": fee_bps, "slippage_bps": slippage_bps, "compute_regimes": compute_regimes,
+            "engine": engine, "keep_surface": keep_surface, "precision": precision, "periods_per_year": periods_per_year,
+            "vol_target": vol_target, "max_leverage": max_leverage, "n_bootstrap": n_bootstrap, "n_jobs": n_jobs,
+            "seed": seed, **({"max_memory": unit_budget} if unit_budget is not None else {}),
+        })
+        for ticker in universe
+        for strategy in strategies
+    ]
+    # (unit index, frame) pairs so the *_all files keep universe order whatever the completion order;
+    # under a memory budget only summaries stay in memory and the rest are kept as CSV paths
+    collected = {"summary": [], "regimes": [], "surface": [], "robustness": [], "memory": []}
+
+    for i, unit, result in (executor or LocalExecutor()).run(units):
+        ticker, strategy = unit.ticker, unit.strategy
+        # file/figure label; the strategy is only spelled out when several are compared
+        label = ticker if len(strategies) == 1 else f"{ticker}_{strategy}"
+        if isinstance(result, Exception):
+            print(f"{label} failed: {result}")
+            continue
+        for kind, frame in result.items():
+            frame["ticker"] = ticker
+            if kind in ("surface", "memory"):
+                frame["strategy"] = strategy
+            if kind == "memory":
+                collected[kind].append((i, frame))
+                continue
+            path = os.path.join(outdir, f"{kind}_{label}_{execution}.csv")
+            frame.to_csv(path, index=False)
+            collected[kind].append((i, path if monitor and kind != "summary" else frame))
+        if "regimes" in result:
+            try:
+                plot_regime_performance(result["regimes"], ticker=label, execution=execution, outdir=figures)
+            except Exception:
+                pass
+        if "surface" in result:
+            try:
+                plot_param_surface(result["surface"], ticker=label, execution=execution, outdir=figures, summary_df=result["summary"])
+            except Exception:
+                pass
+
+    all_summaries, all_regimes, all_surfaces, all_robustness, all_memory = (
+        [item for _, item in sorted(collected[k], key=lambda x: x[0])] for k in ("summary", "regimes", "surface", "robustness", "memory")
+    )
 
     if len(all_summaries) == 0:
         raise RuntimeError("No summaries produced")
 
-    summary_df = pd.concat(all_summaries, ignore_index=True)
-    summary_df.to_csv(os.path.join(outdir, f"summary_all_{execution}.csv"), index=False)
+    with monitor.stage("aggregate") if monitor else nullcontext():
+        summary_df = pd.concat(all_summaries, ignore_index=True)
+        summary_df.to_csv(os.path.join(outdir, f"summary_all_{execution}.csv"), index=False)
+
+        # plot aggregate
+        try:
+            plot_aggregate_returns(summary_df, outdir=figures)
+        except Exception:
+            pass
+
+        if compute_regimes and len(all_regimes) > 0:
+            _write_all(all_regimes, os.path.join(outdir, f"regimes_all_{execution}.csv"))
+
+        if len(all_surfaces) > 0:
+            _write_all(all_surfaces, os.path.join(outdir, f"surface_all_{execution}.csv"))
 
-    # plot aggregate
-    try:
-        plot_aggregate_returns(summary_df, outdir=figures)
-    except Exception:
-        pass
+        if len(all_robustness) > 0:
+            _write_all(all_robustness, os.path.join(outdir, f"robustness_all_{execution}.csv"))
 
-    if compute_regimes and len(all_regimes) > 0:
-        regimes_df = pd.concat(all_regimes, ignore_index=True)
-        regimes_df.to_csv(os.path.join(outdir, f"regimes_all_{execution}.csv"), index=False)
+    if monitor:
+        memory_df = pd.concat(all_memory + [monitor.frame()], ignore_index=True)
+        memory_df.to_csv(os.path.join(outdir, f"memory_all_{execution}.csv"), index=False)
+        peaks = memory_df.groupby("stage", sort=False)["peak_rss_mb"].max()
+        print("Peak RSS by stage: " + ", ".join(f"{stage} {mb:.0f} MB" for stage, mb in peaks.items()))
     return outdir
 
 
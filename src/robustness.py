@@ -0,0 +1,240 @@
+"""Bootstrap / Monte Carlo robustness checks for walk-forward results.
+
+Resamples are an array dimension: every chunk of resamples is evaluated with the
+batched engine in `batched.py`, and chunks can be spread over a process pool.
+"""
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import math
+import os
+import numpy as np
+import pandas as pd
+
+from batched import bar_returns, strategy_returns, stats_matrix, vol_target_scale
+from memory import batched_in
+from strategies import get_strategy
+from walkforward import rolling_splits, slice_window, best_param_columns
+
+
+_EULER_GAMMA = 0.5772156649015329
+
+
+def bootstrap_indices(n: int, n_resamples: int, block: int = 20, method: str = "stationary", rng=None) -> np.ndarray:
+    """Return an (n_resamples, n) array of resampled row positions.
+
+    method='stationary' draws geometric block lengths with mean `block` (Politis-Romano);
+    method='block' uses fixed-length circular blocks. Blocks wrap around the series end.
+    """
+    rng = np.random.default_rng(rng)
+    t = np.arange(n)
+    if method == "stationary":
+        new_block = rng.random((n_resamples, n)) < 1.0 / max(block, 1)
+    elif method == "block":
+        new_block = np.broadcast_to(t % max(block, 1) == 0, (n_resamples, n)).copy()
+    else:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    new_block[:, 0] = True
+    starts = rng.integers(0, n, size=(n_resamples, n))
+    # position where the current block began, carried forward along each row
+    block_start = np.maximum.accumulate(np.where(new_block, t, 0), axis=1)
+    first = np.take_along_axis(starts, block_start, axis=1)
+    return (first + (t - block_start)) % n
+
+
+def _period_sharpe(strat_ret: np.ndarray) -> np.ndarray:
+    # non-annualized mean/std Sharpe over the last axis (the DSR works on per-period values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = strat_ret.std(axis=-1, ddof=1)
+        return np.where(std > 0, strat_ret.mean(axis=-1) / std, np.nan)
+
+
+def expected_max_sharpe(n_trials: int, sharpe_std: float) -> float:
+    """Expected maximum of n_trials Sharpe ratios under the null of zero skill."""
+    if n_trials <= 1 or not np.isfinite(sharpe_std):
+        return 0.0
+    nd = NormalDist()
+    return float(sharpe_std * ((1 - _EULER_GAMMA) * nd.inv_cdf(1 - 1.0 / n_trials) + _EULER_GAMMA * nd.inv_cdf(1 - 1.0 / (n_trials * math.e))))
+
+
+def deflated_sharpe_ratio(returns: pd.Series, n_trials: int, sharpe_std: float) -> float:
+    """Deflated Sharpe ratio (Bailey & Lopez de Prado) of a selected strategy's returns.
+
+    sharpe_std is the cross-sectional std of the per-period Sharpe ratios of all trials.
+    Returns the probability that the true Sharpe exceeds the expected best-of-n_trials noise.
+    """
+    r = pd.Series(returns).dropna().to_numpy(dtype=float)
+    n = len(r)
+    if n < 3:
+        return float("nan")
+    std = r.std(ddof=1)
+    if std == 0:
+        return float("nan")
+    sr = r.mean() / std
+    z = (r - r.mean()) / r.std(ddof=0)
+    skew = float(np.mean(z ** 3))
+    kurt = float(np.mean(z ** 4))
+    denom = 1 - skew * sr + (kurt - 1) / 4.0 * sr ** 2
+    if denom <= 0:
+        return float("nan")
+    sr0 = expected_max_sharpe(n_trials, sharpe_std)
+    return float(NormalDist().cdf((sr - sr0) * math.sqrt(n - 1) / math.sqrt(denom)))
+
+
+def bootstrap_returns(strat_ret: pd.Series, n_resamples: int = 10000, block: int = 20, method: str = "stationary", ci: float = 0.95, periods_per_year: int = 252, seed: Optional[int] = None, chunk_size: int = 1000) -> Dict[str, float]:
+    """Block-bootstrap a return series and report perf_stats with confidence intervals.
+
+    Returns a flat dict: '<metric>' (point estimate), '<metric>_lo' and '<metric>_hi'.
+    """
+    r = pd.Series(strat_ret).fillna(0.0).to_numpy(dtype=float)
+    rng = np.random.default_rng(seed)
+    point = stats_matrix(r, periods_per_year=periods_per_year)
+    samples: Dict[str, List[np.ndarray]] = {k: [] for k in point}
+    for lo in range(0, n_resamples, chunk_size):
+        size = min(chunk_size, n_resamples - lo)
+        idx = bootstrap_indices(len(r), size, block=block, method=method, rng=rng)
+        stats = stats_matrix(r[idx], periods_per_year=periods_per_year)
+        for k, v in stats.items():
+            samples[k].append(v)
+    tail = (1 - ci) / 2 * 100
+    out: Dict[str, float] = {}
+    for k, v in point.items():
+        dist = np.concatenate(samples[k]) if samples[k] else np.array([np.nan])
+        out[k] = float(v)
+        out[f"{k}_lo"] = float(np.nanpercentile(dist, tail))
+        out[f"{k}_hi"] = float(np.nanpercentile(dist, 100 - tail))
+    return out
+
+
+def _scale(close: np.ndarray, vol_target: Optional[float], max_leverage: float, periods_per_year: int) -> Optional[np.ndarray]:
+    if vol_target is None:
+        return None
+    return vol_target_scale(close, vol_target, max_leverage=max_leverage, periods_per_year=periods_per_year)
+
+
+def _resample_fold(cc: np.ndarray, oc: np.ndarray, close0: float, n_train: int, strategy: str, params: List[tuple], n_resamples: int, seed, block: int, method: str, execution: str, fee_bps: float, slippage_bps: float, periods_per_year: int, precision: str = "float64", vol_target: Optional[float] = None, max_leverage: float = 1.0, resample_batch: Optional[int] = None) -> np.ndarray:
+    # Rebuild n_resamples price paths for one fold window, re-run the train grid search
+    # on each and evaluate the chosen params on the test part. Returns (n_resamples, 4):
+    # chosen params index, test ann_return, test sharpe, test max_drawdown.
+    # The train grid runs over at most resample_batch paths at a time (same draws either way).
+    # The strategy travels by name so worker processes only pickle plain data.
+    strat = get_strategy(strategy)
+    rng = np.random.default_rng(seed)
+    idx = bootstrap_indices(len(cc), n_resamples, block=block, method=method, rng=rng)
+    growth = np.ones((n_resamples, len(cc) + 1))
+    growth[:, 1:] = 1.0 + cc[idx]
+    close = close0 * np.cumprod(growth, axis=1)
+    oc_path = np.empty_like(close)
+    oc_path[:, 0] = oc[0]
+    oc_path[:, 1:] = oc[1:][idx]
+    open_ = close / (1.0 + oc_path)
+
+    train_close, test_close = close[:, :n_train], close[:, n_train:]
+    train_ret = bar_returns(train_close, open_[:, :n_train], execution=execution, precision=precision)
+    train_scale = _scale(train_close, vol_target, max_leverage, periods_per_year)
+
+    def train_ann(lo: int, hi: int) -> np.ndarray:
+        signal = strat.batch_signals(train_close[lo:hi], params)
+        scale = None if train_scale is None else train_scale[lo:hi]
+        return stats_matrix(strategy_returns(signal, train_ret[lo:hi], fee_bps, slippage_bps, scale=scale), periods_per_year)["ann_return"]
+
+    ann = np.concatenate(batched_in(train_ann, n_resamples, resample_batch))
+    best = np.argmax(np.where(np.isnan(ann), -np.inf, ann), axis=1)
+
+    # test signals only for the chosen params, one batch per distinct choice
+    test_signal = np.zeros((n_resamples, 1, test_close.shape[1]), dtype=np.int8)
+    for b in np.unique(best):
+        rows = best == b
+        test_signal[rows] = strat.batch_signals(test_close[rows], [params[b]])
+    test_ret = bar_returns(test_close, open_[:, n_train:], execution=execution, precision=precision)
+    test_scale = _scale(test_close, vol_target, max_leverage, periods_per_year)
+    stats = stats_matrix(strategy_returns(test_signal, test_ret, fee_bps, slippage_bps, scale=test_scale)[:, 0], periods_per_year)
+    return np.column_stack([best, stats["ann_return"], stats["sharpe"], stats["max_drawdown"]])
+
+
+def bootstrap_walkforward(df: pd.DataFrame, grid: Optional[List[tuple]] = None, n_resamples: int = 1000, train_years: int = 7, test_years: int = 3, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0, block: int = 20, method: str = "stationary", ci: float = 0.95, seed: Optional[int] = None, chunk_size: int = 250, n_jobs: Optional[int] = 1, periods_per_year: int = 252, precision: str = "float64", strategy: str = "ema_cross", vol_target: Optional[float] = None, max_leverage: float = 1.0, resample_batch: Optional[int] = None) -> pd.DataFrame:
+    """Re-run walk-forward parameter selection on block-bootstrapped price paths.
+
+    For each fold, the train+test window's (close-to-close, open->close) return pairs are
+    resampled jointly, the grid search is repeated on every resampled train window and the
+    chosen pair is scored out of sample. Returns one row per fold with the original
+    selection, bootstrap confidence intervals of OOS ann_return/sharpe, the share of
+    resamples with positive OOS return, the share picking the original params, and the
+    deflated Sharpe ratio of the original in-sample pick.
+
+    n_jobs > 1 (or None for all CPUs) spreads resample chunks over a process pool; results
+    are identical for a given seed whatever n_jobs is. precision='float32' runs the resampled
+    grids in compact dtypes (see batched.PRECISIONS). vol_target/max_leverage apply the same
+    volatility-targeting overlay as run_walkforward_for_ticker. resample_batch caps the
+    resampled paths per train grid pass (memory only; results are unchanged).
+    """
+    strat = get_strategy(strategy)
+    params = [tuple(p) for p in (grid if grid is not None else strat.default_grid) if strat.valid(tuple(p))]
+    if not params:
+        raise ValueError("No valid parameter combination found in grid")
+    folds = rolling_splits(pd.to_datetime(df.index), train_years=train_years, test_years=test_years)
+
+    jobs = []
+    fold_meta = []
+    for k, (train_start, train_end, test_start, test_end) in enumerate(folds):
+        window = slice_window(df, train_start, test_end)
+        n_train = len(slice_window(df, train_start, train_end))
+        if n_train < 2 or len(window) - n_train < 2:
+            continue
+        close = window["Close"].to_numpy(dtype=float)
+        open_ = window["Open"].to_numpy(dtype=float) if "Open" in window else close
+        cc = close[1:] / close[:-1] - 1.0
+        oc = np.nan_to_num(close / open_ - 1.0)
+
+        # original selection, plus per-period Sharpe of every trial for the DSR
+        train_ret = bar_returns(close[:n_train], open_[:n_train], execution=execution)
+        train_scale = _scale(close[:n_train], vol_target, max_leverage, periods_per_year)
+        trials = strategy_returns(strat.batch_signals(close[:n_train], params), train_ret, fee_bps, slippage_bps, scale=train_scale)
+        ann = stats_matrix(trials, periods_per_year)["ann_return"]
+        best = int(np.argmax(np.where(np.isnan(ann), -np.inf, ann)))
+        trial_sharpes = _period_sharpe(trials)
+        dsr = deflated_sharpe_ratio(pd.Series(trials[best]), len(params), float(np.nanstd(trial_sharpes, ddof=1)))
+        fold_meta.append((k, best, dsr))
+
+        for lo in range(0, n_resamples, chunk_size):
+            jobs.append((k, (cc, oc, close[0], n_train, strategy, params, min(chunk_size, n_resamples - lo))))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+    args = [(*a, s, block, method, execution, fee_bps, slippage_bps, periods_per_year, precision, vol_target, max_leverage, resample_batch) for (_, a), s in zip(jobs, seeds)]
+    if n_jobs == 1 or len(args) <= 1:
+        results = [_resample_fold(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+            results = list(pool.map(_resample_fold, *zip(*args)))
+
+    by_fold: Dict[int, List[np.ndarray]] = {}
+    for (k, _), res in zip(jobs, results):
+        by_fold.setdefault(k, []).append(res)
+
+    tail = (1 - ci) / 2 * 100
+    rows = []
+    for k, best, dsr in fold_meta:
+        train_start, train_end, test_start, test_end = folds[k]
+        boot = np.concatenate(by_fold.get(k, [np.empty((0, 4))]))
+        row = {
+            "train_start": train_start,
+            "train_end": train_end,
+            "test_start": test_start,
+            "test_end": test_end,
+            "strategy": strategy,
+            **best_param_columns(strat, params[best]),
+            "n_resamples": len(boot),
+            "train_dsr": dsr,
+        }
+        for j, name in ((1, "test_ann_return"), (2, "test_sharpe")):
+            vals = boot[:, j]
+            if np.isfinite(vals).any():
+                row[f"{name}_median"] = float(np.nanmedian(vals))
+                row[f"{name}_lo"] = float(np.nanpercentile(vals, tail))
+                row[f"{name}_hi"] = float(np.nanpercentile(vals, 100 - tail))
+            else:
+                row[f"{name}_median"] = row[f"{name}_lo"] = row[f"{name}_hi"] = np.nan
+        row["prob_positive"] = float(np.mean(boot[:, 1] > 0)) if len(boot) else np.nan
+        row["param_stability"] = float(np.mean(boot[:, 0] == best)) if len(boot) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
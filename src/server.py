@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Long-running local backtest service with warm in-memory state.
+
+Keeps loaded prices and finished results in memory and runs backtest / walk-forward
+jobs on a bounded thread pool, so repeated what-if queries skip imports, downloads and
+recomputation. JSON over HTTP on localhost:
+
+    GET  /health               -> status, loaded tickers, cache and queue sizes
+    POST /backtest             -> perf_stats for one strategy/params on one ticker
+    POST /walkforward          -> walk-forward summary (and regimes/surface) records for one ticker
+    GET  /jobs/<id>            -> status/result of a job submitted with "wait": false
+
+Run: python src/server.py --port 8765 [--data-dir data --bar 1h]
+"""
+from typing import Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import os
+import threading
+import uuid
+import pandas as pd
+
+from data import download_prices, load_prices, infer_periods_per_year
+from strategies import get_strategy
+from backtest import backtest_close, backtest_open
+from metrics import perf_stats
+from walkforward import run_walkforward_for_ticker
+
+
+# payload keys forwarded to run_walkforward_for_ticker
+WALKFORWARD_KEYS = [
+    "grid", "train_years", "test_years", "fee_bps", "slippage_bps", "execution", "compute_regimes",
+    "engine", "precision", "strategy", "vol_target", "max_leverage", "keep_surface",
+]
+
+
+def _json_value(v):
+    # floats keep their repr (exact round trip), timestamps become ISO strings, NaN/NaT null
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    return v.item() if hasattr(v, "item") else v
+
+
+def _records(df: pd.DataFrame) -> list:
+    return [{k: _json_value(v) for k, v in row.items()} for row in df.to_dict(orient="records")]
+
+
+class BacktestService:
+    """Warm state (price store, result cache) plus a bounded job queue and worker pool.
+
+    Workers are threads so they share the in-memory state; numpy releases the GIL in the
+    batched engine, which is the one to use for interactive queries.
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, bar: Optional[str] = None, start: str = "2012-01-01", max_workers: int = 4, max_queue: int = 64, cache_size: int = 512, chunksize: Optional[int] = None):
+        self.data_dir = data_dir
+        self.bar = bar
+        self.start = start
+        self.chunksize = chunksize
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self._prices: Dict[str, pd.DataFrame] = {}
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._jobs: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    # --- warm state -------------------------------------------------------------
+
+    def prices(self, ticker: str) -> pd.DataFrame:
+        ticker = ticker.upper()
+        with self._lock:
+            df = self._prices.get(ticker)
+        if df is None:
+            if self.data_dir is not None:
+                df = load_prices(self._price_path(ticker), resample=self.bar, chunksize=self.chunksize).loc[self.start:]
+            else:
+                df = download_prices(ticker, start=self.start)
+            with self._lock:
+                df = self._prices.setdefault(ticker, df)
+        return df
+
+    def _price_path(self, ticker: str) -> str:
+        # <data_dir>/<TICKER>.parquet or .csv; KeyError when neither exists
+        for ext in ("parquet", "csv"):
+            path = os.path.join(self.data_dir, f"{ticker}.{ext}")
+            if os.path.exists(path):
+                return path
+        raise KeyError(f"Unknown ticker: {ticker}")
+
+    def _cached(self, key: str, fn):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = fn()
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    # --- jobs -------------------------------------------------------------------
+
+    def run_backtest(self, payload: dict) -> dict:
+        df = self.prices(payload["ticker"])
+        strat = get_strategy(payload.get("strategy", "ema_cross"))
+        window = df.loc[payload.get("start"):payload.get("end")]
+        sig = strat.make_signals(window, tuple(payload.get("params") or strat.default_grid[0]))
+        ppy = payload.get("periods_per_year") or infer_periods_per_year(window.index)
+        kwargs = dict(
+            fee_bps=payload.get("fee_bps", 1.0), slippage_bps=payload.get("slippage_bps", 0.0),
+            vol_target=payload.get("vol_target"), max_leverage=payload.get("max_leverage", 1.0), periods_per_year=ppy,
+        )
+        bt = backtest_open(sig, **kwargs) if payload.get("execution", "close") == "open" else backtest_close(sig, **kwargs)
+        return {k: float(v) for k, v in perf_stats(bt["strat_ret"], periods_per_year=ppy).items()}
+
+    def run_walkforward(self, payload: dict) -> dict:
+        df = self.prices(payload["ticker"])
+        kwargs = {k: payload[k] for k in WALKFORWARD_KEYS if k in payload}
+        kwargs["periods_per_year"] = payload.get("periods_per_year") or infer_periods_per_year(df.index)
+        result = run_walkforward_for_ticker(df, **kwargs)
+        frames = list(result) if isinstance(result, tuple) else [result]
+        out = {"summary": _records(frames.pop(0))}
+        if kwargs.get("compute_regimes"):
+            out["regimes"] = _records(frames.pop(0))
+        if kwargs.get("keep_surface"):
+            out["surface"] = _records(frames.pop(0))
+        return out
+
+    def validate(self, kind: str, payload: dict):
+        """Reject bad client input before it is queued.
+
+        ValueError for a missing ticker, unknown strategy or wrongly sized params/grid;
+        KeyError for a ticker with no file in data_dir (downloads are only checked when run).
+        """
+        ticker = payload.get("ticker")
+        if not isinstance(ticker, str) or not ticker.strip():
+            raise ValueError("Missing 'ticker'")
+        strat = get_strategy(payload.get("strategy", "ema_cross"))
+        combos = [payload["params"]] if kind == "backtest" and payload.get("params") else payload.get("grid") or []
+        for params in combos:
+            if not isinstance(params, (list, tuple)) or len(params) != len(strat.param_names):
+                raise ValueError(f"{strat.name} takes {len(strat.param_names)} params ({', '.join(strat.param_names)}), got {params}")
+        if self.data_dir is not None:
+            with self._lock:
+                loaded = ticker.upper() in self._prices
+            if not loaded:
+                self._price_path(ticker.upper())
+
+    def submit(self, kind: str, payload: dict) -> str:
+        """Queue a job and return its id.
+
+        Raises ValueError/KeyError for bad input (see validate) and RuntimeError when the
+        queue is full.
+        """
+        handlers = {"backtest": self.run_backtest, "walkforward": self.run_walkforward}
+        if kind not in handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self.validate(kind, payload)
+        key = json.dumps({"kind": kind, **payload}, sort_keys=True, default=str)
+        with self._lock:
+            pending = sum(not f.done() for f in self._jobs.values())
+            if pending >= self.max_queue:
+                raise RuntimeError("Job queue is full")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = self._pool.submit(self._cached, key, lambda: handlers[kind](payload))
+            # forget the oldest finished jobs so the job table stays bounded
+            while len(self._jobs) > self.max_queue * 16:
+                oldest = next(iter(self._jobs))
+                if not self._jobs[oldest].done():
+                    break
+                self._jobs.pop(oldest)
+        return job_id
+
+    def job(self, job_id: str, timeout: Optional[float] = 0) -> dict:
+        with self._lock:
+            fut = self._jobs.get(job_id)
+        if fut is None:
+            raise KeyError(job_id)
+        try:
+            result = fut.result(timeout=timeout)
+        except FutureTimeout:
+            return {"job_id": job_id, "status": "running" if fut.running() else "queued"}
+        except Exception as e:
+            return {"job_id": job_id, "status": "error", "error": str(e)}
+        return {"job_id": job_id, "status": "done", "result": result}
+
+    def health(self) -> dict:
+        with self._lock:
+            return {
+                "status": "ok",
+                "tickers": sorted(self._prices),
+                "cached_results": len(self._cache),
+                "pending_jobs": sum(not f.done() for f in self._jobs.values()),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: BacktestService = None
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send(200, self.service.health())
+        if self.path.startswith("/jobs/"):
+            try:
+                return self._send(200, self.service.job(self.path[len("/jobs/"):]))
+            except KeyError:
+                return self._send(404, {"error": "unknown job"})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        kind = self.path.strip("/")
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("Request body must be a JSON object")
+            wait = payload.pop("wait", True)
+            job_id = self.service.submit(kind, payload)
+        except RuntimeError as e:
+            return self._send(503, {"error": str(e)})
+        except KeyError as e:
+            return self._send(404, {"error": e.args[0]})
+        except ValueError as e:
+            return self._send(400 if kind in ("backtest", "walkforward") else 404, {"error": str(e)})
+        if not wait:
+            return self._send(202, {"job_id": job_id, "status": "queued"})
+        out = self.service.job(job_id, timeout=None)
+        self._send(200 if out["status"] == "done" else 500, out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, **service_kwargs) -> ThreadingHTTPServer:
+    """Create the HTTP server bound to host:port (call serve_forever() on the result)."""
+    handler = type("Handler", (_Handler,), {"service": BacktestService(**service_kwargs)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Run the local EMA backtest service")
+    p.add_argument("--host", default="127.0.0.1", help="Bind address (keep on localhost)")
+    p.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    p.add_argument("--data-dir", default=None, help="Load <TICKER>.csv/.parquet from this folder instead of downloading")
+    p.add_argument("--bar", default=None, help="Resample local bars to this frequency, e.g. 5min, 1h, 1D")
+    p.add_argument("--chunksize", type=int, default=None, help="With --bar, stream CSVs in chunks of this many rows and resample each chunk")
+    p.add_argument("--start", default="2012-01-01", help="Start date for historical data (YYYY-MM-DD)")
+    p.add_argument("--workers", type=int, default=4, help="Worker threads")
+    p.add_argument("--max-queue", type=int, default=64, help="Maximum queued jobs before rejecting with 503")
+    p.add_argument("--preload", default="", help="Comma-separated tickers to load into memory at startup")
+    args = p.parse_args()
+    httpd = serve(args.host, args.port, data_dir=args.data_dir, bar=args.bar, start=args.start, max_workers=args.workers, max_queue=args.max_queue, chunksize=args.chunksize)
+    for t in [s.strip().upper() for s in args.preload.split(",") if s.strip()]:
+        httpd.RequestHandlerClass.service.prices(t)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.RequestHandlerClass.service.shutdown()
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
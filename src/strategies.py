@@ -0,0 +1,173 @@
+"""Strategy registry: trend-following families usable by the walk-forward and batched engines.
+
+Each strategy declares its parameter names, default grid, a validity rule, a pandas
+signal function (the reference, same contract as signals.make_signals) and a batched
+signal function returning a (..., P, T) block for batched.evaluate_grid. Signals are
+1 = long, 0 = flat and, for long/short variants, -1 = short.
+"""
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+import batched
+from signals import ema, make_signals
+
+
+class Strategy(NamedTuple):
+    name: str
+    param_names: Tuple[str, ...]
+    default_grid: List[tuple]
+    valid: Callable[[tuple], bool]
+    make_signals: Callable[..., pd.DataFrame]
+    batch_signals: Callable[..., np.ndarray]
+
+
+STRATEGIES: Dict[str, Strategy] = {}
+
+# short/long windows (bars) of the volatility ratio used by ema_vol_filter
+VOL_SHORT = 21
+VOL_LONG = 126
+# rolling return std at or below this counts as exactly 0: pandas' online rolling std leaves
+# residues up to ~1e-9 on all-zero windows where batched.rolling_std gives 0
+VOL_EPS = 1e-8
+
+
+def register(strategy: Strategy) -> Strategy:
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+def get_strategy(name: str) -> Strategy:
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown strategy: {name} (available: {', '.join(sorted(STRATEGIES))})")
+
+
+def _signal_dtype(compact: bool):
+    return np.int8 if compact else int
+
+
+def _spans(params: Sequence[tuple], n: int) -> Tuple[List[int], Dict[int, int]]:
+    # unique windows of the first n params and their row in the moving-average block
+    spans = sorted({p[i] for p in params for i in range(n)})
+    return spans, {s: i for i, s in enumerate(spans)}
+
+
+# --- ema_cross: long when EMA(fast) > EMA(slow) -------------------------------------
+
+def _ema_cross(df: pd.DataFrame, params: tuple, compact: bool = False) -> pd.DataFrame:
+    fast, slow = params
+    return make_signals(df, fast=fast, slow=slow, compact=compact)
+
+
+def _ema_cross_batch(close: np.ndarray, params: Sequence[tuple]) -> np.ndarray:
+    return batched.ema_crossover_signals(close, [tuple(p[:2]) for p in params])
+
+
+# --- ema_cross_ls: long above, short below ------------------------------------------
+
+def _ema_cross_ls(df: pd.DataFrame, params: tuple, compact: bool = False) -> pd.DataFrame:
+    out = _ema_cross(df, params, compact=compact)
+    out["signal"] = (2 * out["signal"] - 1).astype(_signal_dtype(compact))
+    return out
+
+
+def _ema_cross_ls_batch(close: np.ndarray, params: Sequence[tuple]) -> np.ndarray:
+    return np.where(_ema_cross_batch(close, params), 1, -1).astype(np.int8)
+
+
+# --- sma_cross: long when SMA(fast) > SMA(slow), min_periods=1 ----------------------
+
+def _sma_cross(df: pd.DataFrame, params: tuple, compact: bool = False) -> pd.DataFrame:
+    fast, slow = params
+    out = df.copy()
+    out["sma_fast"] = out["Close"].rolling(fast, min_periods=1).mean()
+    out["sma_slow"] = out["Close"].rolling(slow, min_periods=1).mean()
+    out["signal"] = (out["sma_fast"] > out["sma_slow"]).astype(_signal_dtype(compact))
+    return out.dropna()
+
+
+def _sma_cross_batch(close: np.ndarray, params: Sequence[tuple]) -> np.ndarray:
+    windows, col = _spans(params, 2)
+    # averages are compared in float64 (see batched.PRECISIONS)
+    m = batched.sma_matrix(close, windows)
+    return m[..., [col[p[0]] for p in params], :] > m[..., [col[p[1]] for p in params], :]
+
+
+# --- triple_ema: long when EMA(fast) > EMA(mid) > EMA(slow) -------------------------
+
+def _triple_ema(df: pd.DataFrame, params: tuple, compact: bool = False) -> pd.DataFrame:
+    fast, mid, slow = params
+    out = df.copy()
+    out["ema_fast"] = ema(out["Close"], fast)
+    out["ema_mid"] = ema(out["Close"], mid)
+    out["ema_slow"] = ema(out["Close"], slow)
+    long = (out["ema_fast"] > out["ema_mid"]) & (out["ema_mid"] > out["ema_slow"])
+    out["signal"] = long.astype(_signal_dtype(compact))
+    return out.dropna()
+
+
+def _triple_ema_batch(close: np.ndarray, params: Sequence[tuple]) -> np.ndarray:
+    spans, col = _spans(params, 3)
+    e = batched.ema_matrix(close, spans)
+    fast, mid, slow = ([col[p[i]] for p in params] for i in range(3))
+    return (e[..., fast, :] > e[..., mid, :]) & (e[..., mid, :] > e[..., slow, :])
+
+
+# --- ema_vol_filter: EMA crossover, flat when short-term vol is elevated -------------
+
+def _vol_ratio(close: pd.Series) -> pd.Series:
+    # short/long vol; undefined (NaN) while either is undefined or the long vol is 0
+    ret = close.pct_change()
+    short = ret.rolling(VOL_SHORT, min_periods=2).std()
+    long = ret.rolling(VOL_LONG, min_periods=2).std()
+    return short.mask(short <= VOL_EPS, 0.0) / long.where(long > VOL_EPS)
+
+
+def _ema_vol_filter(df: pd.DataFrame, params: tuple, compact: bool = False) -> pd.DataFrame:
+    fast, slow, max_ratio = params
+    out = _ema_cross(df, (fast, slow), compact=compact)
+    ratio = _vol_ratio(df["Close"]).reindex(out.index)
+    # no filter until the vol ratio is defined
+    calm = ~(ratio > max_ratio)
+    out["signal"] = (out["signal"].astype(bool) & calm).astype(_signal_dtype(compact))
+    return out
+
+
+def _ema_vol_filter_batch(close: np.ndarray, params: Sequence[tuple]) -> np.ndarray:
+    close = np.asarray(close, dtype=float)
+    ret = np.full(close.shape, np.nan)
+    ret[..., 1:] = close[..., 1:] / close[..., :-1] - 1.0
+    short = batched.rolling_std(ret, VOL_SHORT)
+    long = batched.rolling_std(ret, VOL_LONG)
+    # same definition as _vol_ratio
+    ratio = np.where(short <= VOL_EPS, 0.0, short) / np.where(long > VOL_EPS, long, np.nan)
+    caps = np.array([p[2] for p in params], dtype=float)[:, None]
+    calm = ~(ratio[..., None, :] > caps)
+    return _ema_cross_batch(close, params) & calm
+
+
+def _fast_slow_grid() -> List[tuple]:
+    return [(f, s) for f in range(5, 31, 5) for s in range(10, 61, 5)]
+
+
+register(Strategy("ema_cross", ("fast", "slow"), _fast_slow_grid(), lambda p: p[1] > p[0], _ema_cross, _ema_cross_batch))
+register(Strategy("ema_cross_ls", ("fast", "slow"), _fast_slow_grid(), lambda p: p[1] > p[0], _ema_cross_ls, _ema_cross_ls_batch))
+register(Strategy("sma_cross", ("fast", "slow"), _fast_slow_grid(), lambda p: p[1] > p[0], _sma_cross, _sma_cross_batch))
+register(Strategy(
+    "triple_ema",
+    ("fast", "mid", "slow"),
+    [(f, m, s) for f in (5, 10, 15) for m in (20, 30, 40) for s in (50, 75, 100, 150)],
+    lambda p: p[0] < p[1] < p[2],
+    _triple_ema,
+    _triple_ema_batch,
+))
+register(Strategy(
+    "ema_vol_filter",
+    ("fast", "slow", "max_ratio"),
+    [(f, s, r) for f, s in _fast_slow_grid() for r in (1.0, 1.25, 1.5)],
+    lambda p: p[1] > p[0],
+    _ema_vol_filter,
+    _ema_vol_filter_batch,
+))
@@ -1,27 +1,37 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import pandas as pd
 import numpy as np
 
-from signals import make_signals
 from backtest import backtest_close, backtest_open
 from metrics import perf_stats
+from strategies import Strategy, get_strategy
 import regimes as regimes_mod
+import batched
+from memory import batched_in
 
 
 def _year_offset(dt: pd.Timestamp, years: int) -> pd.Timestamp:
     try:
         return dt.replace(year=dt.year + years)
     except Exception:
+        # handle Feb 29 -> Feb 28
         return dt + pd.DateOffset(years=years)
 
 
 def rolling_splits(dates: pd.DatetimeIndex, train_years: int = 7, test_years: int = 3) -> List[Tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp, pd.Timestamp]]:
-    # Return list of (train_start, train_end, test_start, test_end) folds
+    """Create rolling train/test splits as (train_start, train_end, test_start, test_end).
+
+    Splits are non-overlapping contiguous windows that advance by test_years each fold.
+    """
     if not isinstance(dates, pd.DatetimeIndex):
         dates = pd.to_datetime(dates)
-    start = dates.min()
+
+    # normalize so intraday folds start at midnight like daily ones
+    start = dates.min().normalize()
     end = dates.max()
-    folds = []
+
+    folds: List[Tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp, pd.Timestamp]] = []
+
     train_start = start
     train_end = _year_offset(train_start, train_years) - pd.Timedelta(days=1)
     while True:
@@ -30,218 +40,155 @@ def rolling_splits(dates: pd.DatetimeIndex, train_years: int = 7, test_years: in
         if test_end > end:
             break
         folds.append((train_start, train_end, test_start, test_end))
+        # advance windows by test_years
         train_start = _year_offset(train_start, test_years)
         train_end = _year_offset(train_start, train_years) - pd.Timedelta(days=1)
-    return folds
-
 
-def grid_search_train(df: pd.DataFrame, train_start: pd.Timestamp, train_end: pd.Timestamp, grid: List[Tuple[int, int]], execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0) -> Tuple[int, int, dict]:
-    # Grid search on train window; returns best (fast, slow, stats) by ann return
-    best = None
-    best_metric = -np.inf
-    train_df = df.loc[train_start:train_end]
-    for fast, slow in grid:
-        if slow <= fast:
-            continue
-        sig = make_signals(train_df, fast=fast, slow=slow)
-        if execution == "close":
-            bt = backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-        else:
-            bt = backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-        stats = perf_stats(bt["strat_ret"]) if "strat_ret" in bt else perf_stats(bt["ret"])
-        ann = float(stats.get("ann_return", -np.inf) or -np.inf)
-        if ann > best_metric:
-            best_metric = ann
-            best = (fast, slow, stats)
-    if best is None:
-        raise ValueError("No valid parameter combination found in grid")
-    return best
+    return folds
 
 
-def evaluate_params(df: pd.DataFrame, fast: int, slow: int, test_start: pd.Timestamp, test_end: pd.Timestamp, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0) -> dict:
-    # Evaluate chosen params on test window and return stats
-    test_df = df.loc[test_start:test_end]
-    sig = make_signals(test_df, fast=fast, slow=slow)
-    if execution == "close":
-        bt = backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-    else:
-        bt = backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-    stats = perf_stats(bt["strat_ret"]) if "strat_ret" in bt else perf_stats(bt["ret"])
-    return stats
+def slice_window(df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Rows of df from start through the whole of end's calendar day.
 
+    Fold boundaries are dates; for intraday bars a plain df.loc[start:end] would drop
+    every bar after midnight on the last day.
+    """
+    return df.loc[start:pd.Timestamp(end).normalize() + pd.Timedelta(days=1) - pd.Timedelta(1)]
 
-def run_walkforward_for_ticker(df: pd.DataFrame, grid: List[Tuple[int, int]] = None, train_years: int = 7, test_years: int = 3, fee_bps: float = 1.0, slippage_bps: float = 0.0, execution: str = "close", compute_regimes: bool = False, vol_window: int = 21, vol_q: int = 4):
-    # Run rolling walk-forward on one ticker. Returns summary or (summary, regimes_df).
-    if grid is None:
-        grid = [(f, s) for f in range(5, 31, 5) for s in range(10, 61, 5)]
-    idx = pd.to_datetime(df.index)
-    folds = rolling_splits(idx, train_years=train_years, test_years=test_years)
-    rows = []
-    regimes_rows = []
-    for train_start, train_end, test_start, test_end in folds:
-        try:
-            best_fast, best_slow, train_stats = grid_search_train(df, train_start, train_end, grid, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps)
-            test_stats = evaluate_params(df, best_fast, best_slow, test_start, test_end, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps)
-            rows.append({
-                "train_start": train_start,
-                "train_end": train_end,
-                "test_start": test_start,
-                "test_end": test_end,
-                "best_fast": int(best_fast),
-                "best_slow": int(best_slow),
-                "train_ann_return": float(train_stats.get("ann_return", pd.NA)),
-                "test_ann_return": float(test_stats.get("ann_return", pd.NA)),
-                "test_sharpe": float(test_stats.get("sharpe", pd.NA)),
-                "test_max_dd": float(test_stats.get("max_drawdown", pd.NA)),
-            })
-            if compute_regimes:
-                test_df = df.loc[test_start:test_end]
-                sig = make_signals(test_df, fast=best_fast, slow=best_slow)
-                if execution == "close":
-                    bt = backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-                else:
-                    bt = backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-                vol = regimes_mod.realized_vol(test_df, window=vol_window)
-                labels = regimes_mod.regime_labels_from_vol(vol, q=vol_q)
-                perf_by_regime = regimes_mod.performance_by_regime(bt, labels)
-                for _, r in perf_by_regime.iterrows():
-                    regimes_rows.append({
-                        "train_start": train_start,
-                        "train_end": train_end,
-                        "test_start": test_start,
-                        "test_end": test_end,
-                        "best_fast": int(best_fast),
-                        "best_slow": int(best_slow),
-                        "regime": int(r["regime"]),
-                        "ann_return": float(r.get("ann_return", pd.NA)),
-                        "ann_vol": float(r.get("ann_vol", pd.NA)),
-                        "sharpe": float(r.get("sharpe", pd.NA)),
-                        "max_drawdown": float(r.get("max_drawdown", pd.NA)),
-                    })
-        except Exception as e:
-            rows.append({
-                "train_start": train_start,
-                "train_end": train_end,
-                "test_start": test_start,
-                "test_end": test_end,
-                "error": str(e),
-            })
-    summary = pd.DataFrame(rows)
-    if compute_regimes:
-        regimes_df = pd.DataFrame(regimes_rows)
-        return summary, regimes_df
-    return summary
-from typing import List, Tuple
-import pandas as pd
-import numpy as np
-from datetime import timedelta
 
-from signals import make_signals
-from backtest import backtest_close, backtest_open
-from metrics import perf_stats
-import regimes as regimes_mod
-from backtest import backtest_close, backtest_open
+def _backtest(window: pd.DataFrame, strat: Strategy, params: tuple, execution: str, fee_bps: float, slippage_bps: float, compact: bool = False, vol_target: Optional[float] = None, max_leverage: float = 1.0, periods_per_year: int = 252) -> pd.DataFrame:
+    sig = strat.make_signals(window, params, compact=compact)
+    sizing = dict(vol_target=vol_target, max_leverage=max_leverage, periods_per_year=periods_per_year)
+    if execution == "close":
+        return backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps, **sizing)
+    return backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps, **sizing)
 
 
-def _year_offset(dt: pd.Timestamp, years: int) -> pd.Timestamp:
-    try:
-        return dt.replace(year=dt.year + years)
-    except Exception:
-        # handle Feb 29 -> Feb 28
-        return dt + pd.DateOffset(years=years)
+def _batched_grid(train_df: pd.DataFrame, strat: Strategy, params: List[tuple], execution: str, fee_bps: float, slippage_bps: float, precision: str = "float64", periods_per_year: int = 252, vol_target: Optional[float] = None, max_leverage: float = 1.0, grid_batch: Optional[int] = None) -> List[dict]:
+    # one perf_stats-style dict per parameter tuple, computed in vectorized passes of at
+    # most grid_batch tuples (smaller on MemoryError)
+    close = train_df["Close"].to_numpy(dtype=float)
+    open_ = train_df["Open"].to_numpy(dtype=float) if execution == "open" else None
 
+    def evaluate(lo: int, hi: int) -> dict:
+        return batched.evaluate_grid(
+            close, params[lo:hi], open_=open_, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps,
+            periods_per_year=periods_per_year, precision=precision, signal_fn=strat.batch_signals,
+            vol_target=vol_target, max_leverage=max_leverage,
+        )
 
-def rolling_splits(dates: pd.DatetimeIndex, train_years: int = 7, test_years: int = 3) -> List[Tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp, pd.Timestamp]]:
-    """Create rolling train/test splits as (train_start, train_end, test_start, test_end).
+    out = []
+    for stats in batched_in(evaluate, len(params), grid_batch):
+        out.extend({k: float(v[i]) for k, v in stats.items()} for i in range(len(next(iter(stats.values())))))
+    return out
 
-    Splits are non-overlapping contiguous windows that advance by test_years each fold.
-    """
-    if not isinstance(dates, pd.DatetimeIndex):
-        dates = pd.to_datetime(dates)
 
-    start = dates.min()
-    end = dates.max()
+def _param_value(v):
+    return int(v) if float(v).is_integer() else float(v)
 
-    folds: List[Tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp, pd.Timestamp]] = []
 
-    train_start = start
-    train_end = _year_offset(train_start, train_years) - pd.Timedelta(days=1)
-    while True:
-        test_start = train_end + pd.Timedelta(days=1)
-        test_end = _year_offset(test_start, test_years) - pd.Timedelta(days=1)
-        if test_end > end:
-            break
-        folds.append((train_start, train_end, test_start, test_end))
-        # advance windows by test_years
-        train_start = _year_offset(train_start, test_years)
-        train_end = _year_offset(train_start, train_years) - pd.Timedelta(days=1)
+def best_param_columns(strat: Strategy, params: tuple) -> dict:
+    """Summary columns for a selected parameter tuple, e.g. {'best_fast': 10, 'best_slow': 30}."""
+    return {f"best_{name}": _param_value(v) for name, v in zip(strat.param_names, params)}
 
-    return folds
 
+def grid_search_train(df: pd.DataFrame, train_start: pd.Timestamp, train_end: pd.Timestamp, grid: Optional[List[tuple]] = None, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0, engine: str = "pandas", return_surface: bool = False, precision: str = "float64", periods_per_year: int = 252, strategy: str = "ema_cross", vol_target: Optional[float] = None, max_leverage: float = 1.0, grid_batch: Optional[int] = None):
+    """Grid-search on train window; return the best parameters by annual return on strategy.
+    Returns (best_params, metrics), or (best_params, metrics, surface) when return_surface is
+    True. surface is a Series of train ann_return indexed by the strategy's parameter names
+    (e.g. fast, slow); surface.unstack() gives the fast x slow grid.
 
-def grid_search_train(df: pd.DataFrame, train_start: pd.Timestamp, train_end: pd.Timestamp, grid: List[Tuple[int, int]], execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0) -> Tuple[int, int, dict]:
-    """Grid-search on train window; return best (fast, slow) by annual return on strategy.
-    Returns (best_fast, best_slow, metrics).
+    strategy names an entry of strategies.STRATEGIES; grid defaults to its default_grid and
+    invalid tuples (e.g. slow <= fast) are skipped.
+    engine='batched' evaluates all tuples at once with batched.py; it falls back to the pandas
+    loop when the window has missing prices. precision='float32' runs the batched engine in
+    compact dtypes (and stores compact signal columns on the pandas path).
+    vol_target/max_leverage size positions with the volatility-targeting overlay of
+    backtest.vol_target_scale on both engines. grid_batch caps the tuples per batched pass
+    (see memory.py); results do not depend on it.
     """
+    if execution not in ("close", "open"):
+        raise ValueError(f"Unknown execution mode: {execution}")
+    if engine not in ("pandas", "batched"):
+        raise ValueError(f"Unknown engine: {engine}")
+    strat = get_strategy(strategy)
+    train_df = slice_window(df, train_start, train_end)
+    params = [tuple(p) for p in (grid if grid is not None else strat.default_grid) if strat.valid(tuple(p))]
+    price_cols = ["Close", "Open"] if execution == "open" else ["Close"]
+    if engine == "batched" and params and not train_df[price_cols].isna().to_numpy().any():
+        all_stats = _batched_grid(train_df, strat, params, execution, fee_bps, slippage_bps, precision=precision, periods_per_year=periods_per_year, vol_target=vol_target, max_leverage=max_leverage, grid_batch=grid_batch)
+    else:
+        all_stats = []
+        for p in params:
+            bt = _backtest(train_df, strat, p, execution, fee_bps, slippage_bps, compact=precision == "float32", vol_target=vol_target, max_leverage=max_leverage, periods_per_year=periods_per_year)
+            all_stats.append(perf_stats(bt["strat_ret"] if "strat_ret" in bt else bt["ret"], periods_per_year=periods_per_year))
+
     best = None
     best_metric = -np.inf
-    train_df = df.loc[train_start:train_end]
-    for fast, slow in grid:
-        if slow <= fast:
-            continue
-        sig = make_signals(train_df, fast=fast, slow=slow)
-        if execution == "close":
-            bt = backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-        elif execution == "open":
-            bt = backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-        else:
-            raise ValueError(f"Unknown execution mode: {execution}")
-        stats = perf_stats(bt["strat_ret"]) if "strat_ret" in bt else perf_stats(bt["ret"])
+    for p, stats in zip(params, all_stats):
         ann = float(stats.get("ann_return", -np.inf) or -np.inf)
         if ann > best_metric:
             best_metric = ann
-            best = (fast, slow, stats)
+            best = (p, stats)
 
     if best is None:
         raise ValueError("No valid parameter combination found in grid")
+    if return_surface:
+        surface = pd.Series(
+            [float(stats.get("ann_return", np.nan)) for stats in all_stats],
+            index=pd.MultiIndex.from_tuples(params, names=list(strat.param_names)),
+            name="train_ann_return",
+        )
+        return (*best, surface)
     return best
 
 
-def evaluate_params(df: pd.DataFrame, fast: int, slow: int, test_start: pd.Timestamp, test_end: pd.Timestamp, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0) -> dict:
-    test_df = df.loc[test_start:test_end]
-    sig = make_signals(test_df, fast=fast, slow=slow)
-    if execution == "close":
-        bt = backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-    else:
-        bt = backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-    stats = perf_stats(bt["strat_ret"]) if "strat_ret" in bt else perf_stats(bt["ret"])
+def evaluate_params(df: pd.DataFrame, params: tuple, test_start: pd.Timestamp, test_end: pd.Timestamp, execution: str = "close", fee_bps: float = 1.0, slippage_bps: float = 0.0, periods_per_year: int = 252, strategy: str = "ema_cross", vol_target: Optional[float] = None, max_leverage: float = 1.0) -> dict:
+    test_df = slice_window(df, test_start, test_end)
+    bt = _backtest(test_df, get_strategy(strategy), tuple(params), execution, fee_bps, slippage_bps, vol_target=vol_target, max_leverage=max_leverage, periods_per_year=periods_per_year)
+    stats = perf_stats(bt["strat_ret"] if "strat_ret" in bt else bt["ret"], periods_per_year=periods_per_year)
     return stats
 
 
-def run_walkforward_for_ticker(df: pd.DataFrame, grid: List[Tuple[int, int]] = None, train_years: int = 7, test_years: int = 3, fee_bps: float = 1.0, slippage_bps: float = 0.0, execution: str = "close", compute_regimes: bool = False, vol_window: int = 21, vol_q: int = 4) -> pd.DataFrame:
+def run_walkforward_for_ticker(df: pd.DataFrame, grid: Optional[List[tuple]] = None, train_years: int = 7, test_years: int = 3, fee_bps: float = 1.0, slippage_bps: float = 0.0, execution: str = "close", compute_regimes: bool = False, vol_window: int = 21, vol_q: int = 4, engine: str = "pandas", keep_surface: bool = False, precision: str = "float64", periods_per_year: int = 252, strategy: str = "ema_cross", vol_target: Optional[float] = None, max_leverage: float = 1.0, grid_batch: Optional[int] = None):
     """Run rolling walk-forward on a single ticker price DataFrame.
 
-    Returns a DataFrame summarizing each fold with selected params and test metrics.
-    """
-    if grid is None:
-        # default reasonable grid
-        grid = [(f, s) for f in range(5, 31, 5) for s in range(10, 61, 5)]
+    Returns a DataFrame summarizing each fold with the strategy name, selected params
+    (best_<param> columns, e.g. best_fast/best_slow) and test metrics.
+    With compute_regimes and/or keep_surface, returns a tuple (summary, regimes_df, surface_df)
+    holding only the requested frames. surface_df is long-format (fold dates, one column per
+    parameter, train_ann_return) with the full grid surface of every fold.
 
+    periods_per_year is the annualization factor of the bars (252 for daily; see
+    data.infer_periods_per_year for intraday). vol_target (annualized) scales positions to
+    target volatility, capped at max_leverage, in both train and test. grid_batch caps the
+    parameter tuples per batched train pass to bound memory.
+    """
+    strat = get_strategy(strategy)
     idx = pd.to_datetime(df.index)
     folds = rolling_splits(idx, train_years=train_years, test_years=test_years)
     rows = []
     regimes_rows = []
+    surfaces = []
     for train_start, train_end, test_start, test_end in folds:
         try:
-            best_fast, best_slow, train_stats = grid_search_train(df, train_start, train_end, grid, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps)
-            test_stats = evaluate_params(df, best_fast, best_slow, test_start, test_end, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps)
+            best = grid_search_train(df, train_start, train_end, grid, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps, engine=engine, return_surface=keep_surface, precision=precision, periods_per_year=periods_per_year, strategy=strategy, vol_target=vol_target, max_leverage=max_leverage, grid_batch=grid_batch)
+            best_params, train_stats = best[:2]
+            if keep_surface:
+                surface = best[2].reset_index()
+                surface.insert(0, "train_start", train_start)
+                surface.insert(1, "train_end", train_end)
+                surface.insert(2, "test_start", test_start)
+                surface.insert(3, "test_end", test_end)
+                surfaces.append(surface)
+            test_stats = evaluate_params(df, best_params, test_start, test_end, execution=execution, fee_bps=fee_bps, slippage_bps=slippage_bps, periods_per_year=periods_per_year, strategy=strategy, vol_target=vol_target, max_leverage=max_leverage)
             rows.append({
                 "train_start": train_start,
                 "train_end": train_end,
                 "test_start": test_start,
                 "test_end": test_end,
-                "best_fast": int(best_fast),
-                "best_slow": int(best_slow),
+                "strategy": strategy,
+                **best_param_columns(strat, best_params),
                 "train_ann_return": float(train_stats.get("ann_return", np.nan)),
                 "test_ann_return": float(test_stats.get("ann_return", np.nan)),
                 "test_sharpe": float(test_stats.get("sharpe", np.nan)),
@@ -249,17 +196,13 @@ def run_walkforward_for_ticker(df: pd.DataFrame, grid: List[Tuple[int, int]] = N
             })
             if compute_regimes:
                 # compute full test backtest df to derive regime-level performance
-                test_df = df.loc[test_start:test_end]
-                sig = make_signals(test_df, fast=best_fast, slow=best_slow)
-                if execution == "close":
-                    bt = backtest_close(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
-                else:
-                    bt = backtest_open(sig, fee_bps=fee_bps, slippage_bps=slippage_bps)
+                test_df = slice_window(df, test_start, test_end)
+                bt = _backtest(test_df, strat, best_params, execution, fee_bps, slippage_bps, vol_target=vol_target, max_leverage=max_leverage, periods_per_year=periods_per_year)
 
                 # compute realized vol and regime labels on the test period
-                vol = regimes_mod.realized_vol(test_df, window=vol_window)
+                vol = regimes_mod.realized_vol(test_df, window=vol_window, periods_per_year=periods_per_year)
                 labels = regimes_mod.regime_labels_from_vol(vol, q=vol_q)
-                perf_by_regime = regimes_mod.performance_by_regime(bt, labels)
+                perf_by_regime = regimes_mod.performance_by_regime(bt, labels, periods_per_year=periods_per_year)
                 # attach fold metadata
                 for _, r in perf_by_regime.iterrows():
                     regimes_rows.append({
@@ -267,8 +210,8 @@ def run_walkforward_for_ticker(df: pd.DataFrame, grid: List[Tuple[int, int]] = N
                         "train_end": train_end,
                         "test_start": test_start,
                         "test_end": test_end,
-                        "best_fast": int(best_fast),
-                        "best_slow": int(best_slow),
+                        "strategy": strategy,
+                        **best_param_columns(strat, best_params),
                         "regime": int(r["regime"]),
                         "ann_return": float(r.get("ann_return", np.nan)),
                         "ann_vol": float(r.get("ann_vol", np.nan)),
@@ -281,11 +224,14 @@ def run_walkforward_for_ticker(df: pd.DataFrame, grid: List[Tuple[int, int]] = N
                 "train_end": train_end,
                 "test_start": test_start,
                 "test_end": test_end,
+                "strategy": strategy,
                 "error": str(e),
             })
 
     summary = pd.DataFrame(rows)
+    out = [summary]
     if compute_regimes:
-        regimes_df = pd.DataFrame(regimes_rows)
-        return summary, regimes_df
-    return summary
+        out.append(pd.DataFrame(regimes_rows))
+    if keep_surface:
+        out.append(pd.concat(surfaces, ignore_index=True) if surfaces else pd.DataFrame())
+    return tuple(out) if len(out) > 1 else summary